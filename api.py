@@ -3,17 +3,20 @@ from typing import Dict
 from dotenv import load_dotenv
 
 from service import QAService
+import metrics
+from metrics import HTTP_SECONDS
 from models import *
 
+import os
 import time
 import logging
-#logging.basicConfig(level=logging.DEBUG)
 
 load_dotenv()
 
 from fastapi import FastAPI, UploadFile, File, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
 from typing import List, Optional
 
 app = FastAPI(
@@ -22,34 +25,79 @@ app = FastAPI(
     version="1.0.0"
 )
 
-qa_service = QAService()
+qa_service = QAService(
+    vector_store_mode=os.getenv("VECTOR_STORE_MODE", "per_document"),
+    max_loaded_systems=int(os.getenv("MAX_LOADED_DOCUMENTS", "32")),
+    # comma-separated document ids to open at boot
+    preload=[doc_id for doc_id in os.getenv("PRELOAD_DOCUMENTS", "").split(",") if doc_id],
+    vector_store_type=os.getenv("VECTOR_STORE_TYPE", "chroma"),
+    llm_type=os.getenv("LLM_TYPE", "openai"),
+    embeddings_type=os.getenv("EMBEDDINGS_TYPE", "openai"),
+    data_directory=os.getenv("QA_DATA_DIR"),
+    max_upload_bytes=int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+)
 
-# Configure logging (optional)
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 
 @app.middleware("http")
 async def log_client_details(request: Request, call_next):
-    client_ip = request.client.host  # Get client IP address
-    user_agent = request.headers.get("user-agent", "unknown")  # Get User-Agent header
-    method = request.method  # HTTP method (GET, POST, etc.)
-    path = request.url.path  # Request path
+    # %-style arguments are only formatted if DEBUG is enabled
+    logger.debug(
+        "Client IP: %s | User Agent: %s | Method: %s | Path: %s",
+        request.client.host if request.client else "unknown",
+        request.headers.get("user-agent", "unknown"),
+        request.method,
+        request.url.path
+    )
 
-    # Log the request details
-    logging.info(f"Client IP: {client_ip} | User Agent: {user_agent} | Method: {method} | Path: {path}")
-    
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    start_time = time.perf_counter()
+    response = None
+    content_length = request.headers.get("content-length")
+    if request.url.path.startswith("/documents") and content_length:
+        try:
+            length = int(content_length)
+        except ValueError:
+            response = JSONResponse(
+                status_code=400,
+                content={"detail": f"Invalid Content-Length header: {content_length!r}"}
+            )
+        else:
+            if length > qa_service.max_upload_bytes + 64 * 1024:
+                # refused before the multipart body is read; allow some room for the form framing
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload is larger than {qa_service.max_upload_bytes} bytes"}
+                )
+    if response is None:
+        response = await call_next(request)
+    process_time = time.perf_counter() - start_time
 
-    # Log the response time
-    logging.info(f"Completed in {process_time:.2f} seconds with status code {response.status_code}")
+    # the route template, not the path, so document ids don't become label values
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        process_time,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    logger.debug("Completed in %.2f seconds with status code %s", process_time, response.status_code)
     return response
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latency histograms, token and cache counters in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ws/socket.io/")
 async def socket_io_not_supported():
     return {"message": "WebSocket (Socket.io) is not supported."}
 
+def _discard(staged):
+    """Remove a staged upload the service did not take over (it moves the ones it accepts)"""
+    if staged is not None and os.path.exists(staged.path):
+        os.remove(staged.path)
+
 @app.post("/documents/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
@@ -61,16 +109,24 @@ async def upload_document(
             detail="Only PDF files are supported"
         )
     
+    staged = None
     try:
-        content = await file.read()
-        metadata = await qa_service.process_document(content, file.filename)
-        
+        staged = await qa_service.stage_upload(file.file)
+        metadata = await qa_service.process_document(staged.path, file.filename, staged.content_hash)
+        doc_status = qa_service.get_status(metadata.document_id)
+        if doc_status.stage == "ready":
+            message = "Document already indexed"
+        else:
+            message = "Document accepted for processing"
+
         return DocumentUploadResponse(
             document_id=metadata.document_id,
             filename=metadata.filename,
-            message="Document processed successfully",
-            status="success"
+            message=message,
+            status=doc_status.stage
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         import traceback
@@ -79,6 +135,8 @@ async def upload_document(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    finally:
+        _discard(staged)
 
 @app.post("/qa/question", response_model=QuestionResponse)
 async def ask_question(
@@ -89,12 +147,104 @@ async def ask_question(
         return await qa_service.get_answer(
             question=request.question,
             document_id=request.document_id,
+            include_timings=request.include_timings
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.get("/documents/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: str,
+):
+    """Report the ingestion stage and progress of an uploaded document"""
+    return qa_service.get_status(document_id)
+
+@app.post("/qa/questions", response_model=BatchQuestionResponse)
+async def ask_questions(
+    request: BatchQuestionRequest,
+):
+    """Ask many questions in one request; results come back in order with a status per item"""
+    try:
+        results = await qa_service.get_answers(request.items, request.max_concurrency)
+        return BatchQuestionResponse(results=results)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/qa/question/stream")
+async def ask_question_stream(
+    request: QuestionRequest,
+):
+    """Stream the answer as Server-Sent Events: sources, then tokens, then done"""
+    # fail with a proper status code before the stream starts
+    await qa_service.get_qa_system(request.document_id)
+
+    async def events():
+        try:
+            async for event, data in qa_service.stream_answer(request.question, request.document_id):
+                if event == "sources":
+                    data = [doc.dict() for doc in data]
+                elif event == "token":
+                    data = {"content": data}
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.put("/documents/{document_id}", response_model=DocumentUploadResponse)
+async def update_document(
+    document_id: str,
+    file: UploadFile = File(...),
+):
+    """Replace a document with a revised PDF; only pages whose text changed are re-embedded"""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only PDF files are supported"
+        )
+
+    if document_id not in qa_service.documents:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document with ID {document_id} not found"
+        )
+
+    staged = None
+    try:
+        staged = await qa_service.stage_upload(file.file)
+        metadata = await qa_service.update_document(document_id, staged.path, file.filename, staged.content_hash)
+        doc_status = qa_service.get_status(metadata.document_id)
+        if doc_status.stage == "ready":
+            message = "Document already indexed"
+        else:
+            message = "Document accepted for re-indexing"
+
+        return DocumentUploadResponse(
+            document_id=metadata.document_id,
+            filename=metadata.filename,
+            message=message,
+            status=doc_status.stage
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    finally:
+        _discard(staged)
 
 @app.delete("/documents/{document_id}")
 async def delete_document(
@@ -110,6 +260,8 @@ async def delete_document(
     try:
         qa_service.cleanup_document(document_id)
         return {"message": f"Document {document_id} deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -122,4 +274,6 @@ async def list_documents():
     return list(qa_service.documents.values())
 
 if __name__ == "__main__":
+    import uvicorn
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Throughput of QASystem.query (blocking, one at a time on the loop) vs QASystem.aquery (gathered).
+
+Usage: python bench/bench_concurrency.py [--questions 50] [--latency 0.2] [--concurrency 1 8 32]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import QAConfig, DocumentChunk
+from qa_system import QASystem
+from fakes import offline_qa_system
+
+
+def build_system(store_path: str, latency: float) -> QASystem:
+    qa_system = offline_qa_system(QAConfig(vector_store_type="chroma", vector_store_path=store_path), llm_latency=latency)
+    chunks = [
+        DocumentChunk(f"Section {i} describes qubit {i % 7} and gate fidelity {i}.", {"page": i // 10, "chunk_id": i})
+        for i in range(200)
+    ]
+    qa_system.vector_store.store_documents(chunks)
+    return qa_system
+
+
+async def run_blocking(qa_system: QASystem, questions):
+    # what get_answer did before: the sync chain runs on the event loop
+    async def one(question):
+        return qa_system.query(question)
+    return await asyncio.gather(*(one(q) for q in questions))
+
+
+async def run_async(qa_system: QASystem, questions, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(question):
+        async with semaphore:
+            return await qa_system.aquery(question)
+    return await asyncio.gather(*(one(q) for q in questions))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated LLM latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    questions = [f"What is the fidelity of qubit {i % 7}?" for i in range(args.questions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        qa_system = build_system(os.path.join(tmp, "db"), args.latency)
+
+        start = time.perf_counter()
+        asyncio.run(run_blocking(qa_system, questions))
+        elapsed = time.perf_counter() - start
+        print(f"{'query (blocking)':<22} {len(questions) / elapsed:8.1f} q/s  {elapsed:6.2f}s")
+
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            asyncio.run(run_async(qa_system, questions, concurrency))
+            elapsed = time.perf_counter() - start
+            print(f"{f'aquery (c={concurrency})':<22} {len(questions) / elapsed:8.1f} q/s  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
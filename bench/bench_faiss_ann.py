@@ -0,0 +1,94 @@
+"""Recall@k and query latency of the FAISS ANN index types against the exact flat index.
+
+Chunks are synthetic text embedded with the offline hash embeddings; the flat index's
+results are the ground truth.
+
+Usage: python bench/bench_faiss_ann.py [--chunks 20000] [--queries 200] [--k 10] [--nlist 256]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import QAConfig, DocumentChunk
+from stores import FAISSVectorStore
+from fakes import HashEmbeddings
+from synthetic import _WORDS
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+
+
+def _chunks(count: int, rng: random.Random):
+    return [
+        DocumentChunk(" ".join(rng.choice(_WORDS) for _ in range(60)), {"chunk_id": i})
+        for i in range(count)
+    ]
+
+
+def run(args) -> list:
+    rng = random.Random(0)
+    embeddings = HashEmbeddings()
+    chunks = _chunks(args.chunks, rng)
+    queries = [embeddings.embed_query(" ".join(rng.choice(_WORDS) for _ in range(12))) for _ in range(args.queries)]
+
+    results, truth = [], None
+    with tempfile.TemporaryDirectory() as tmp:
+        for index_type in INDEX_TYPES:
+            config = QAConfig(
+                source_file_path="",
+                vector_store_type="faiss",
+                vector_store_path=os.path.join(tmp, index_type),
+                faiss_index_type=index_type,
+                faiss_train_size=args.chunks,
+                faiss_nlist=args.nlist,
+                faiss_nprobe=args.nprobe,
+                faiss_ef_search=args.ef_search
+            )
+            store = FAISSVectorStore(config, embeddings)
+            start = time.perf_counter()
+            store.store_documents(chunks)
+            build_seconds = time.perf_counter() - start
+
+            found, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                docs = store.store.similarity_search_by_vector(query, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found.append({doc.metadata["chunk_id"] for doc in docs})
+            if truth is None:
+                truth = found
+
+            recall = statistics.mean(len(f & t) / len(t) for f, t in zip(found, truth))
+            latencies.sort()
+            results.append({
+                "index": index_type,
+                "build_s": round(build_seconds, 2),
+                f"recall@{args.k}": round(recall, 3),
+                "p50_ms": round(latencies[len(latencies) // 2], 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+                "index_mb": round(os.path.getsize(os.path.join(config.vector_store_path, "index.faiss")) / 1e6, 1)
+            })
+            print(json.dumps(results[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Import time of the entry modules, from `python -X importtime`, checked against a budget.
+
+Each module is imported in a fresh interpreter --repeat times and the fastest run is
+kept. The report lists the cumulative import time, the top-level packages that cost the
+most, and any backend package that should only load on first use. Exits 1 when a module
+is over its budget or pulls in one of those backends.
+
+Usage: python bench/bench_import_time.py [--budget api=1500 service=1200] [--repeat 3] [--top 10] [--output report.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds of cumulative import time
+DEFAULT_BUDGETS = {"api": 1500, "service": 1200, "qa_system": 1000}
+# backends the factories import only when a QAConfig selects them
+LAZY_PACKAGES = ["langchain_openai", "langchain_community", "langchain_chroma", "chromadb", "faiss", "langsmith"]
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us, depth) for every line -X importtime printed"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def measure(module: str) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        # api builds a QAService on import; keep its files out of the source tree
+        env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused"), "QA_DATA_DIR": tmp}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        )
+    return parse_importtime(result.stderr)
+
+
+def report_for(module: str, rows: list, top: int) -> dict:
+    total_us = next(cumulative for name, _, cumulative, depth in rows if name == module and depth == 0)
+    by_package = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    slowest = sorted(by_package.items(), key=lambda item: -item[1])[:top]
+    loaded = {name.split(".")[0] for name, _, _, _ in rows}
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "slowest_packages_ms": {package: round(us / 1000, 1) for package, us in slowest},
+        "eager_backends": sorted(package for package in LAZY_PACKAGES if package in loaded)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", nargs="+", default=[f"{m}={ms}" for m, ms in DEFAULT_BUDGETS.items()],
+                        help="module=milliseconds pairs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    budgets = {module: float(ms) for module, ms in (item.split("=", 1) for item in args.budget)}
+    report, failures = {}, []
+    for module, budget_ms in budgets.items():
+        runs = [report_for(module, measure(module), args.top) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["total_ms"])
+        best["budget_ms"] = budget_ms
+        report[module] = best
+        if best["total_ms"] > budget_ms:
+            failures.append(f"{module}: {best['total_ms']} ms is over its {budget_ms} ms budget")
+        if best["eager_backends"]:
+            failures.append(f"{module}: imports {', '.join(best['eager_backends'])} at import time")
+
+    report = {"modules": report, "failures": failures}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Ingestion throughput and peak RSS: load-all path vs streaming process-pool path.
+
+Each run happens in a fresh subprocess so peak RSS is not shared between them.
+Worker processes are started by the forkserver, so their RSS is not included.
+
+Usage: python bench/bench_ingestion.py [--pages 300] [--workers 4] [--embed-latency 0.02] [--store chroma]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import write_synthetic_pdf
+
+
+def _peak_rss_mb(who) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def run_once(pdf_path: str, streaming: bool, workers: int, embed_latency: float, store_type: str) -> dict:
+    from config import QAConfig
+    from processors import DocumentProcessor
+    from stores import VectorStoreFactory
+    from fakes import HashEmbeddings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = QAConfig(
+            vector_store_type=store_type,
+            vector_store_path=os.path.join(tmp, "index"),
+            ingest_streaming=streaming,
+            ingest_workers=workers,
+        )
+        processor = DocumentProcessor(config)
+        store = VectorStoreFactory.create_vector_store(config, HashEmbeddings(latency=embed_latency))
+        counted = {"pages": 0, "chunks": 0}
+        baseline_rss = _peak_rss_mb(resource.RUSAGE_SELF)
+
+        def count(items, key):
+            for item in items:
+                counted[key] += 1
+                yield item
+
+        start = time.perf_counter()
+        if streaming:
+            chunks = count(processor.iter_chunks(count(processor.iter_pages(pdf_path), "pages")), "chunks")
+        else:
+            documents = processor.load_documents(pdf_path)
+            counted["pages"] = len(documents)
+            chunks = processor.split_documents(documents)
+            counted["chunks"] = len(chunks)
+        store.store_documents(chunks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "path": "streaming" if streaming else "load-all",
+        "pages": counted["pages"],
+        "chunks": counted["chunks"],
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(counted["pages"] / elapsed, 1),
+        "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        # growth over the RSS after imports, i.e. what the document itself costs
+        "peak_rss_growth_mb": round(_peak_rss_mb(resource.RUSAGE_SELF) - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="simulated seconds per embeddings call")
+    parser.add_argument("--store", default="chroma", choices=["chroma", "faiss"])
+    parser.add_argument("--child", nargs=2, metavar=("PDF", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        pdf_path, mode = args.child
+        print(json.dumps(run_once(pdf_path, mode == "streaming", args.workers, args.embed_latency, args.store)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB")
+        for mode in ("load-all", "streaming"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", pdf_path, mode,
+                 "--workers", str(args.workers), "--embed-latency", str(args.embed_latency), "--store", args.store],
+                check=True, capture_output=True, text=True
+            ).stdout
+            print(json.dumps(json.loads(output.strip().splitlines()[-1])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory and retrieval latency as the number of documents grows: one store per document vs one shared store.
+
+Each (mode, documents) pair runs in a fresh subprocess so RSS numbers are independent.
+
+Usage: python bench/bench_multitenant.py [--documents 10 50 200] [--chunks 20] [--store chroma]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import QAConfig, DocumentChunk
+from fakes import offline_qa_system
+from synthetic import _WORDS
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _chunks(doc: int, count: int, rng: random.Random):
+    return [
+        DocumentChunk(f"Document {doc} chunk {i}: " + " ".join(rng.choice(_WORDS) for _ in range(120)), {"page": i // 4, "chunk_id": i})
+        for i in range(count)
+    ]
+
+
+def run_once(mode: str, documents: int, chunks: int, store_type: str, queries: int) -> dict:
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        rss_before = _rss_mb()
+        systems = []
+        start = time.perf_counter()
+        shared = None
+        if mode == "shared":
+            shared = offline_qa_system(QAConfig(vector_store_type=store_type, vector_store_path=os.path.join(tmp, "shared")))
+        for doc in range(documents):
+            doc_id = f"doc-{doc}"
+            if shared is not None:
+                qa_system = shared.for_document(doc_id)
+                chunk_list = [DocumentChunk(c.content, {**c.metadata, "document_id": doc_id}) for c in _chunks(doc, chunks, rng)]
+            else:
+                qa_system = offline_qa_system(QAConfig(vector_store_type=store_type, vector_store_path=os.path.join(tmp, doc_id)))
+                chunk_list = _chunks(doc, chunks, rng)
+            qa_system.vector_store.store_documents(chunk_list)
+            systems.append(qa_system)
+        ingest_seconds = time.perf_counter() - start
+        rss_after = _rss_mb()
+
+        latencies = []
+        for _ in range(queries):
+            qa_system = rng.choice(systems)
+            question = " ".join(rng.choice(_WORDS) for _ in range(6))
+            start = time.perf_counter()
+            docs = qa_system.get_retriever().invoke(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+            # every document has more than k chunks, so a filtered search must still find k
+            assert len(docs) == 5, f"{len(docs)} sources for {qa_system.document_id}"
+            if qa_system.document_id is not None:
+                assert all(d.metadata["document_id"] == qa_system.document_id for d in docs)
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "documents": documents,
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+        "rss_per_document_mb": round((rss_after - rss_before) / documents, 2),
+        "ingest_seconds": round(ingest_seconds, 2),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per document")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--store", default="chroma", choices=["chroma", "faiss"])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DOCUMENTS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, documents = args.child
+        print(json.dumps(run_once(mode, int(documents), args.chunks, args.store, args.queries)))
+        return
+
+    for documents in args.documents:
+        for mode in ("per_document", "shared"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(documents), "--chunks", str(args.chunks),
+                 "--queries", str(args.queries), "--store", args.store],
+                check=True, capture_output=True, text=True
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory per chunk, query latency and recall@k of each numpy-store quantization mode.
+
+Chunks are source_data.pdf's own chunks plus extra word windows cut from the same text,
+to get a bigger matrix without exact duplicates (which would make recall ties). They are
+embedded with the offline hash embeddings at OpenAI's dimension. Queries are word windows
+cut from random chunks; the float32 store's results are the ground truth.
+
+Usage: python bench/bench_quantization.py [--pdf source_data.pdf] [--dim 1536] [--chunks 2000] [--k 5] [--rerank 50]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import QAConfig, DocumentChunk
+from processors import DocumentProcessor
+from stores import NumpyVectorStore
+from fakes import HashEmbeddings
+
+
+def _chunks(pdf_path: str, count: int, rng: random.Random):
+    processor = DocumentProcessor(QAConfig(source_file_path=pdf_path))
+    texts = [chunk.content for chunk in processor.split_documents(processor.load_documents(pdf_path))]
+    words = " ".join(texts).split()
+    while len(texts) < count:
+        start = rng.randrange(len(words) - 150)
+        texts.append(" ".join(words[start:start + 150]))
+    return [DocumentChunk(text, {"chunk_id": i}) for i, text in enumerate(texts)]
+
+
+def _queries(chunks, count: int, rng: random.Random):
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks).content.split()
+        start = rng.randrange(max(1, len(words) - 15))
+        queries.append(" ".join(words[start:start + 15]))
+    return queries
+
+
+def run(args) -> list:
+    rng = random.Random(0)
+    embeddings = HashEmbeddings(size=args.dim)
+    chunks = _chunks(args.pdf, args.chunks, rng)
+    queries = [embeddings.embed_query(q) for q in _queries(chunks, args.queries, rng)]
+    modes = [("float32", 0), ("float16", 0), ("int8", 0), ("int8", args.rerank), ("binary", 0), ("binary", args.rerank)]
+
+    results, truth = [], None
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantization, rerank in modes:
+            config = QAConfig(
+                source_file_path=args.pdf,
+                vector_store_type="numpy",
+                vector_store_path=os.path.join(tmp, f"{quantization}-{rerank}"),
+                vector_quantization=quantization,
+                rerank_candidates=rerank
+            )
+            store = NumpyVectorStore(config, embeddings)
+            store.store_documents(chunks)
+
+            found, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                docs = store.similarity_search_by_vector(query, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found.append({doc.metadata["chunk_id"] for doc in docs})
+            if truth is None:
+                truth = found
+
+            def size(name):
+                path = os.path.join(config.vector_store_path, name)
+                return os.path.getsize(path) if os.path.exists(path) else 0
+
+            latencies.sort()
+            results.append({
+                "quantization": quantization,
+                "rerank_candidates": rerank,
+                "chunks": len(chunks),
+                # vectors.bin is what every query scans, so it is what stays resident
+                "resident_bytes_per_chunk": size("vectors.bin") // len(chunks),
+                "disk_bytes_per_chunk": (size("vectors.bin") + size("full.bin")) // len(chunks),
+                f"recall@{args.k}": round(statistics.mean(len(f & t) / len(t) for f, t in zip(found, truth)), 3),
+                "p50_ms": round(latencies[len(latencies) // 2], 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3)
+            })
+            print(json.dumps(results[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=os.path.join(ROOT, "source_data.pdf"))
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank", type=int, default=50)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
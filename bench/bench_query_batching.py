@@ -0,0 +1,98 @@
+"""Round trips and latency of query embeddings with and without the cross-request micro-batcher.
+
+Questions arrive open-loop (Poisson, --rate per second for --duration seconds) and each
+one calls aembed_query on embeddings built by EmbeddingsFactory, the way QASystem does.
+The backend is bench/fakes.HashEmbeddings, which takes --latency seconds plus
+--latency-per-text for each text per call and counts its calls (round trips).
+max_wait 0 is the unbatched baseline; p99_increase_ms is measured against the first
+--max-wait given, so list 0 first.
+
+Usage: python bench/bench_query_batching.py [--rate 300] [--duration 5] [--latency 0.05] [--max-wait 0 0.002 0.005 0.01]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import QAConfig
+from embeddings import EmbeddingsFactory
+from fakes import register_offline_backends
+from suite import _percentiles, _questions
+
+
+async def load(embeddings, questions, rate: float, seed: int = 1):
+    rng = random.Random(seed)
+    latencies = []
+
+    async def one(question):
+        start = time.perf_counter()
+        await embeddings.aembed_query(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    for question in questions:
+        tasks.append(asyncio.create_task(one(question)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def measure(args, max_wait: float, questions) -> dict:
+    config = QAConfig(
+        embeddings_type="hash",
+        embeddings_config={"latency": args.latency, "latency_per_text": args.latency_per_text},
+        query_batch_max_wait=max_wait,
+        query_batch_max_size=args.max_size
+    )
+    embeddings = EmbeddingsFactory.create_embeddings(config)
+    backend = embeddings.backend if max_wait > 0 else embeddings
+
+    start = time.perf_counter()
+    latencies = asyncio.run(load(embeddings, questions, args.rate))
+    elapsed = time.perf_counter() - start
+    return {
+        "max_wait_ms": max_wait * 1000,
+        "queries": len(questions),
+        "round_trips": backend.calls,
+        "queries_per_round_trip": round(len(questions) / backend.calls, 2),
+        "round_trips_per_sec": round(backend.calls / elapsed, 1),
+        **_percentiles(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=300, help="questions per second")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake backend latency per call")
+    parser.add_argument("--latency-per-text", type=float, default=0.0002)
+    parser.add_argument("--max-wait", type=float, nargs="+", default=[0, 0.002, 0.005, 0.01])
+    parser.add_argument("--max-size", type=int, default=64)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    register_offline_backends()
+    questions = _questions(int(args.rate * args.duration))
+    report = {
+        "rate": args.rate,
+        "backend_latency_ms": args.latency * 1000,
+        "results": [measure(args, max_wait, questions) for max_wait in args.max_wait]
+    }
+    baseline = report["results"][0]["p99_ms"]
+    for result in report["results"]:
+        result["p99_increase_ms"] = round(result["p99_ms"] - baseline, 3)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Throughput against a rate-limited API: per-system OpenAI clients vs the shared ClientRegistry clients.
+
+A local stand-in for the OpenAI embeddings endpoint serves --server-rpm requests per
+minute (a token bucket holding one second of budget) and answers everything over that
+with a 429 and retry-after-ms, the way the API does. --workers threads, one per
+"document", each make --requests embed_documents calls back to back:
+
+  per_system     a new OpenAIEmbeddings per worker, as every QASystem had before (SDK retries)
+  shared_retry   EmbeddingsFactory clients: shared pool, jittered retries, 429s pause all callers
+  shared_limit   the same with embeddings_requests_per_minute set to the server's limit
+
+rejected counts the 429s the server sent (wasted round trips), failed the calls that
+gave up. Goodput is successful calls per second. Exits 1 if shared_limit has any failed
+call or more than --max-rejected of its calls were rejected.
+
+Usage: python bench/bench_rate_limit.py [--server-rpm 600] [--workers 16] [--requests 10] [--latency 0.02] [--max-rejected 0.05]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from clients import TokenBucket
+from config import QAConfig
+from embeddings import EmbeddingsFactory
+from suite import _percentiles
+
+
+class StandInAPI(ThreadingHTTPServer):
+    """/v1/embeddings with a server-side requests-per-minute limit"""
+
+    daemon_threads = True
+
+    def __init__(self, requests_per_minute: int, latency: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60))
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self) -> float:
+        """0 if the request is within the limit, else the seconds until it would be"""
+        with self.lock:
+            wait = self.bucket.take(1, time.monotonic())
+            if wait > 0:
+                # a rejected request does not use up the budget
+                self.bucket.take(-1, time.monotonic())
+                self.rejected += 1
+            else:
+                self.served += 1
+            return wait
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        wait = self.server.admit()
+        if wait > 0:
+            self._reply(
+                429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(int(wait * 1000) + 1)}
+            )
+            return
+        time.sleep(self.server.latency)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self._reply(200, {
+            "object": "list",
+            "model": body.get("model", ""),
+            "data": [{"object": "embedding", "index": i, "embedding": [0.1] * 8} for i in range(len(inputs))],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}
+        })
+
+
+def _settings(base_url: str, model: str) -> dict:
+    return {"base_url": base_url, "api_key": "sk-local", "model": model, "check_embedding_ctx_length": False}
+
+
+def run(name: str, make_client, server: StandInAPI, workers: int, requests: int) -> dict:
+    server.served = server.rejected = 0
+    latencies, failed = [], []
+
+    def worker(index):
+        client = make_client()
+        for i in range(requests):
+            start = time.perf_counter()
+            try:
+                client.embed_documents([f"document {index} chunk {i}"])
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                failed.append(type(e).__name__)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "client": name,
+        "elapsed_s": round(elapsed, 2),
+        "succeeded": len(latencies),
+        "failed": len(failed),
+        "rejected": server.rejected,
+        "goodput_per_sec": round(len(latencies) / elapsed, 1),
+        **(_percentiles(latencies) if latencies else {})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server-rpm", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=10, help="calls per worker")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in API latency per call")
+    parser.add_argument("--max-rejected", type=float, default=0.05,
+                        help="largest share of shared_limit calls the server may reject")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    from langchain_openai import OpenAIEmbeddings
+
+    server = StandInAPI(args.server_rpm, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def shared(model, requests_per_minute=None):
+        # distinct model names, since limiters are shared per model
+        config = QAConfig(
+            embeddings_type="openai",
+            embeddings_config=_settings(base_url, model),
+            embeddings_requests_per_minute=requests_per_minute
+        )
+        return lambda: EmbeddingsFactory.create_embeddings(config)
+
+    clients = {
+        "per_system": lambda: OpenAIEmbeddings(**_settings(base_url, "bench-per-system")),
+        "shared_retry": shared("bench-shared-retry"),
+        "shared_limit": shared("bench-shared-limit", args.server_rpm),
+    }
+    report = {
+        "server_rpm": args.server_rpm,
+        "workers": args.workers,
+        "calls": args.workers * args.requests,
+        "results": [run(name, make, server, args.workers, args.requests) for name, make in clients.items()]
+    }
+    server.shutdown()
+    failures = []
+    limited = next(result for result in report["results"] if result["client"] == "shared_limit")
+    if limited["failed"]:
+        failures.append(f"shared_limit: {limited['failed']} calls failed")
+    if limited["rejected"] > args.max_rejected * report["calls"]:
+        failures.append(f"shared_limit: {limited['rejected']} of {report['calls']} calls rejected with 429")
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Throughput and chunk-size spread of the token splitter against RecursiveCharacterTextSplitter.
+
+Pages come from --pdf (default source_data.pdf) or, with --pages, from a synthetic PDF.
+They are extracted once, then each splitter splits all of them --repeat times and the
+fastest run is kept. Chunk sizes are reported in tokens (context.count_tokens); the
+coefficient of variation (stdev / mean) is the number to compare.
+
+Usage: python bench/bench_splitter.py [--pdf source_data.pdf | --pages 200] [--repeat 3] [--output report.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import QAConfig
+from context import count_tokens
+from processors import DocumentProcessor
+from synthetic import write_synthetic_pdf
+
+SPLITTERS = {
+    "recursive_character": {"text_splitter": "recursive_character"},
+    "token": {"text_splitter": "token"},
+}
+
+
+def measure(pages, name: str, overrides: dict, repeat: int) -> dict:
+    processor = DocumentProcessor(QAConfig(**overrides))
+    characters = sum(len(page.content) for page in pages)
+    best, chunks = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = processor.split_documents(pages)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    sizes = [count_tokens(chunk.content) for chunk in chunks]
+    mean = statistics.mean(sizes)
+    stdev = statistics.pstdev(sizes)
+    return {
+        "splitter": name,
+        "chunks": len(chunks),
+        "split_s": round(best, 4),
+        "mb_per_sec": round(characters / best / 1e6, 2),
+        "chunks_per_sec": round(len(chunks) / best, 1),
+        "tokens_mean": round(mean, 1),
+        "tokens_stdev": round(stdev, 1),
+        "tokens_cv": round(stdev / mean, 3),
+        "tokens_min": min(sizes),
+        "tokens_max": max(sizes)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=os.path.join(ROOT, "source_data.pdf"))
+    parser.add_argument("--pages", type=int, help="split a synthetic PDF with this many pages instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if args.pages:
+            pdf_path = os.path.join(tmp, "bench.pdf")
+            write_synthetic_pdf(pdf_path, args.pages)
+        pages = DocumentProcessor(QAConfig()).load_documents(pdf_path)
+
+    report = {
+        "pages": len(pages),
+        "characters": sum(len(page.content) for page in pages),
+        "results": [measure(pages, name, overrides, args.repeat) for name, overrides in SPLITTERS.items()]
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Local stand-ins for the OpenAI backends so benchmarks run offline and deterministically."""
+import asyncio
+import math
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words feature hashing: similar texts get similar vectors, no network needed.
+
+    Each embed_documents call counts as one round trip (calls) and takes latency seconds
+    plus latency_per_text for each text in it.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in _TOKEN_RE.findall(text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.size] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _delay(self, texts: List[str]) -> float:
+        self.calls += 1
+        return self.latency + self.latency_per_text * len(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self._delay(texts)
+        if delay:
+            time.sleep(delay)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self._delay(texts)
+        if delay:
+            await asyncio.sleep(delay)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class EchoChatModel(BaseChatModel):
+    """Chat model that waits `latency` seconds and answers with the start of its prompt.
+
+    When streaming, words are emitted `token_latency` seconds apart after the initial latency.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_chars: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _answer(self, messages) -> ChatResult:
+        text = messages[-1].content[: self.answer_chars]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._answer(messages)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._answer(messages).generations[0].message.content
+        for word in re.findall(r"\S+\s*", text):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def register_offline_backends(llm_latency: float = 0.0, embed_latency: float = 0.0):
+    """Make embeddings_type="hash" and llm_type="echo" available to the factories.
+
+    embeddings_config / llm_config are passed to HashEmbeddings / EchoChatModel,
+    e.g. {"latency": 0.05}; without one the latencies given here are used.
+    """
+    from embeddings import EmbeddingsFactory
+    from llm import LLMFactory
+
+    EmbeddingsFactory.register(
+        "hash", lambda config: HashEmbeddings(**config.embeddings_config or {"latency": embed_latency}),
+        batch_queries=True
+    )
+    LLMFactory.register("echo", lambda config: EchoChatModel(**config.llm_config or {"latency": llm_latency}))
+
+
+def offline_qa_system(config, document_id=None, llm_latency: float = 0.0, embed_latency: float = 0.0):
+    """Build a QASystem for `config` on the local stand-ins instead of OpenAI."""
+    from qa_system import QASystem
+
+    register_offline_backends()
+    config.embeddings_type = "hash"
+    config.embeddings_config = {"latency": embed_latency}
+    config.llm_type = "echo"
+    config.llm_config = {"latency": llm_latency}
+    return QASystem(config, document_id)
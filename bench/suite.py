@@ -0,0 +1,254 @@
+"""Offline benchmark suite: one JSON report for CI regression tracking.
+
+Everything runs in-process on the local stand-ins registered with the factories
+(embeddings_type="hash", llm_type="echo"), so results depend only on this code and
+the machine. Sections:
+
+  startup    fresh interpreter importing api (builds the FastAPI app and QAService)
+  processor  DocumentProcessor load + split of a synthetic PDF
+  stores     QASystem.initialize and QASystem.query on every vector store backend
+  api        upload, ingestion and /qa/question through the FastAPI app (httpx ASGI transport)
+
+Usage:
+  python bench/suite.py [--pages 60] [--queries 200] [--llm-latency 0] [--output report.json]
+  python bench/suite.py --compare baseline.json [--tolerance 0.2]   # exit 1 on regressions
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import register_offline_backends
+from synthetic import _WORDS, write_synthetic_pdf
+
+STORE_TYPES = ["chroma", "faiss", "numpy"]
+
+
+def _percentiles(samples_ms) -> dict:
+    samples = sorted(samples_ms)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def _questions(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [f"What does the text say about {' '.join(rng.sample(_WORDS, 3))}?" for _ in range(count)]
+
+
+def _offline_env(data_directory: str) -> dict:
+    return {
+        **os.environ,
+        "LLM_TYPE": "echo",
+        "EMBEDDINGS_TYPE": "hash",
+        "QA_DATA_DIR": data_directory,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused")
+    }
+
+
+def startup_probe():
+    """Runs in the child interpreter started by bench_startup"""
+    start = time.perf_counter()
+    register_offline_backends()
+    import api  # noqa: F401
+    print(json.dumps({"import_api_s": time.perf_counter() - start}))
+
+
+def bench_startup(tmp: str) -> dict:
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--startup-probe"],
+        env=_offline_env(os.path.join(tmp, "startup")),
+        capture_output=True, text=True, check=True
+    ).stdout
+    total = time.perf_counter() - start
+    probe = json.loads(out.strip().splitlines()[-1])
+    return {"process_s": round(total, 3), "import_api_s": round(probe["import_api_s"], 3)}
+
+
+def bench_processor(pdf_path: str, pages: int) -> dict:
+    from config import QAConfig
+    from processors import DocumentProcessor
+
+    processor = DocumentProcessor(QAConfig(source_file_path=pdf_path))
+    start = time.perf_counter()
+    documents = processor.load_documents(pdf_path)
+    loaded = time.perf_counter()
+    chunks = processor.split_documents(documents)
+    done = time.perf_counter()
+    return {
+        "pages": pages,
+        "chunks": len(chunks),
+        "load_pages_per_sec": round(pages / (loaded - start), 1),
+        "split_chunks_per_sec": round(len(chunks) / (done - loaded), 1),
+        "pages_per_sec": round(pages / (done - start), 1)
+    }
+
+
+def bench_store(store_type: str, pdf_path: str, pages: int, tmp: str, questions, llm_latency: float) -> dict:
+    from config import QAConfig
+    from qa_system import QASystem
+
+    config = QAConfig(
+        source_file_path=pdf_path,
+        vector_store_type=store_type,
+        vector_store_path=os.path.join(tmp, store_type),
+        llm_type="echo",
+        llm_config={"latency": llm_latency},
+        embeddings_type="hash"
+    )
+    qa_system = QASystem(config)
+    chunks = []
+    start = time.perf_counter()
+    qa_system.initialize(pdf_path, on_progress=lambda stage, done=None, total=None: chunks.append(done or 0))
+    ingest = time.perf_counter() - start
+
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        qa_system.query(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "ingest_s": round(ingest, 3),
+        "ingest_pages_per_sec": round(pages / ingest, 1),
+        "ingest_chunks_per_sec": round(max(chunks) / ingest, 1),
+        "query": _percentiles(latencies)
+    }
+
+
+async def _drive_api(pdf_path: str, questions) -> dict:
+    import httpx
+    import api
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        with open(pdf_path, "rb") as f:
+            response = await client.post("/documents/upload", files={"file": ("bench.pdf", f, "application/pdf")})
+        response.raise_for_status()
+        document_id = response.json()["document_id"]
+        upload = time.perf_counter() - start
+        while True:
+            stage = (await client.get(f"/documents/{document_id}/status")).json()["stage"]
+            if stage in ("ready", "failed"):
+                break
+            await asyncio.sleep(0.01)
+        if stage == "failed":
+            raise RuntimeError("ingestion failed in the api benchmark")
+        ready = time.perf_counter() - start
+
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            response = await client.post("/qa/question", json={"question": question, "document_id": document_id})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {"upload_ms": round(upload * 1000, 3), "upload_to_ready_s": round(ready, 3), "question": _percentiles(latencies)}
+
+
+def bench_api(pdf_path: str, tmp: str, questions) -> dict:
+    # api builds its QAService on import, from these variables
+    os.environ.update(_offline_env(os.path.join(tmp, "api")))
+    return asyncio.run(_drive_api(pdf_path, questions))
+
+
+def run(args) -> dict:
+    register_offline_backends(llm_latency=args.llm_latency)
+    questions = _questions(args.queries)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {"pages": args.pages, "queries": args.queries, "llm_latency": args.llm_latency}
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        write_synthetic_pdf(pdf_path, args.pages)
+
+        report["startup"] = bench_startup(tmp)
+        report["processor"] = bench_processor(pdf_path, args.pages)
+        report["stores"] = {
+            store_type: bench_store(store_type, pdf_path, args.pages, tmp, questions, args.llm_latency)
+            for store_type in STORE_TYPES
+        }
+        report["api"] = bench_api(pdf_path, tmp, questions)
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def _flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics that got worse than baseline by more than tolerance (a fraction)"""
+    regressions = []
+    current = _flatten(report)
+    for key, before in _flatten(baseline).items():
+        after = current.get(key)
+        if after is None or not before or key.startswith("args.") or key == "cpus":
+            continue
+        if key.endswith("_per_sec"):
+            change = (before - after) / before
+        elif key.endswith(("_ms", "_s", "_mb")):
+            change = (after - before) / before
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": key, "baseline": before, "current": after, "worse_by": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated LLM latency in seconds")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report; exit 1 if any metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_probe:
+        startup_probe()
+        return
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
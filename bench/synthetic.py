@@ -0,0 +1,51 @@
+"""Synthetic fixtures for benchmarks."""
+import random
+
+_WORDS = (
+    "quantum qubit gate circuit fidelity noise error correction entanglement superposition "
+    "measurement benchmark volume depth layer decoherence readout calibration algorithm "
+    "sampling amplitude phase hamiltonian variational optimizer classical simulation"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0):
+    """Write a text-only PDF with `pages` pages of pseudo-random sentences."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = [
+            f"Page {page} line {i}: " + " ".join(rng.choice(_WORDS) for _ in range(12)) + "."
+            for i in range(lines_per_page)
+        ]
+        stream = "BT /F1 9 Tf 40 800 Td 16 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
@@ -0,0 +1,101 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Entry:
+    __slots__ = ("embedding", "value", "created_at")
+
+    def __init__(self, embedding: np.ndarray, value: Any):
+        self.embedding = embedding
+        self.value = value
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """Per-document answer cache looked up by cosine similarity of the question embedding.
+
+    Entries expire after ttl_seconds and each document keeps at most
+    max_entries_per_document, evicting the least recently used.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600, max_entries_per_document: int = 256):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_document = max_entries_per_document
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return re.sub(r"\s+", " ", question.strip().lower())
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, document_id: str, embedding: List[float]) -> Optional[Any]:
+        entries = self._entries.get(document_id)
+        if entries:
+            now = time.monotonic()
+            for key in [k for k, e in entries.items() if now - e.created_at > self.ttl_seconds]:
+                del entries[key]
+        if not entries:
+            self.misses += 1
+            return None
+
+        keys = list(entries.keys())
+        matrix = np.stack([entries[key].embedding for key in keys])
+        scores = matrix @ self._unit(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        entries.move_to_end(keys[best])
+        self.hits += 1
+        return entries[keys[best]].value
+
+    def store(self, document_id: str, question: str, embedding: List[float], value: Any):
+        entries = self._entries.setdefault(document_id, OrderedDict())
+        key = self.normalize_question(question)
+        entries[key] = _Entry(self._unit(embedding), value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries_per_document:
+            entries.popitem(last=False)
+
+    def invalidate(self, document_id: str):
+        self._entries.pop(document_id, None)
+
+    async def single_flight(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn once for concurrent callers with the same key.
+
+        Returns (result, shared) where shared is True for callers that joined
+        a call already in flight.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        # fn runs as its own task and every caller, this one included, waits on it shielded:
+        # a caller going away (a client disconnecting) must not cancel it for the others
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+
+        def done(task):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not task.cancelled():
+                # retrieved here so an error nobody is left waiting for is not logged as unhandled
+                task.exception()
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task), False
@@ -1,7 +1,12 @@
+import asyncio
 import httpx
+import json
 import os
-from typing import List, Optional
-from models import DocumentUploadResponse, QuestionResponse, DocumentMetadata, QuestionRequest
+from typing import AsyncIterator, List, Optional, Tuple
+from models import (
+    DocumentUploadResponse, QuestionResponse, DocumentMetadata, QuestionRequest, DocumentStatusResponse,
+    BatchQuestionRequest, BatchQuestionResult
+)
 from pydantic import BaseModel
 
 # Define the base URL for the API
@@ -25,6 +30,26 @@ class DocumentQAClient:
             response.raise_for_status()
             return DocumentUploadResponse(**response.json())
 
+    async def get_document_status(self, document_id: str) -> DocumentStatusResponse:
+        """Gets the ingestion stage and progress of an uploaded document."""
+        response = await self.client.get(f"/documents/{document_id}/status")
+        response.raise_for_status()
+        return DocumentStatusResponse(**response.json())
+
+    async def wait_until_ready(self, document_id: str, poll_interval: float = 1.0, timeout: Optional[float] = None) -> DocumentStatusResponse:
+        """Polls the document status until ingestion finishes; raises if it failed or timed out."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            doc_status = await self.get_document_status(document_id)
+            if doc_status.stage == "ready":
+                return doc_status
+            if doc_status.stage == "failed":
+                raise RuntimeError(f"Document {document_id} failed to process: {doc_status.error}")
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError(f"Document {document_id} still {doc_status.stage} after {timeout}s")
+            await asyncio.sleep(poll_interval)
+
     async def ask_question(self, document_id: str, question: str) -> QuestionResponse:
         """Asks a question about an uploaded document."""
         question_data = QuestionRequest(question=question, document_id=document_id)
@@ -32,6 +57,28 @@ class DocumentQAClient:
         response.raise_for_status()
         return QuestionResponse(**response.json())
 
+    async def ask_questions(self, items: List[Tuple[str, str]], max_concurrency: Optional[int] = None) -> List[BatchQuestionResult]:
+        """Asks a batch of (document_id, question) pairs; results are in the same order, each with a status."""
+        batch = BatchQuestionRequest(
+            items=[QuestionRequest(document_id=document_id, question=question) for document_id, question in items],
+            max_concurrency=max_concurrency
+        )
+        response = await self.client.post("/qa/questions", json=batch.dict(), timeout=300.0)
+        response.raise_for_status()
+        return [BatchQuestionResult(**result) for result in response.json()["results"]]
+
+    async def stream_question(self, document_id: str, question: str) -> AsyncIterator[dict]:
+        """Streams the answer; yields {"event": "sources"|"token"|"done"|"error", "data": ...} as it arrives."""
+        question_data = QuestionRequest(question=question, document_id=document_id)
+        async with self.client.stream("POST", "/qa/question/stream", json=question_data.dict(), timeout=None) as response:
+            response.raise_for_status()
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    yield {"event": event, "data": json.loads(line[len("data: "):])}
+
     async def delete_document(self, document_id: str) -> dict:
         """Deletes a document and its resources."""
         response = await self.client.delete(f"/documents/{document_id}")
@@ -56,6 +103,7 @@ async def main():
         file_name = os.getcwd() + "/source_data.pdf"
         upload_response = await client.upload_document(file_name)
         print("Uploaded document:", upload_response)
+        await client.wait_until_ready(upload_response.document_id)
     except httpx.HTTPStatusError as e:
         print("Error uploading document:", e)
 
@@ -65,9 +113,19 @@ async def main():
             query = input("Enter you query: ")
             if "exit" in query:
                 break
-            question_response = await client.ask_question(upload_response.document_id, query)
-            print("Question response:", question_response.answer)
-            print(f"sources: {question_response.source_documents}")
+            print("Question response: ", end="", flush=True)
+            sources, error = [], None
+            async for message in client.stream_question(upload_response.document_id, query):
+                if message["event"] == "token":
+                    print(message["data"]["content"], end="", flush=True)
+                elif message["event"] == "sources":
+                    sources = message["data"]
+                elif message["event"] == "error":
+                    error = message["data"]["detail"]
+            if error is not None:
+                print(f"\nError answering question: {error}")
+            else:
+                print(f"\nsources: {sources}")
     except httpx.HTTPStatusError as e:
         print("Error asking question:", e)
 
@@ -89,5 +147,4 @@ async def main():
     await client.close()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,295 @@
+"""Process-wide API clients: shared connection pools, client-side rate limits and retries.
+
+Every QASystem asks the factories for its LLM and embeddings; for the HTTP backends
+those now come from ClientRegistry, so systems with the same backend configuration
+share one client object, one connection pool per API host and one RateLimiter per
+model. The limiter and the retries live in an httpx transport, below the OpenAI SDK,
+so they apply to every call the SDK makes (its own retries are turned off).
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from context import count_tokens
+from metrics import API_RETRIES, RATE_LIMIT_WAIT
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """rate units per second, up to capacity saved up; take() may overdraw and reports the wait"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+
+    def take(self, amount: float, now: float) -> float:
+        """Seconds until amount is covered; the caller must wait that long before using it"""
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+        self._level -= amount
+        return max(0.0, -self._level / self.rate)
+
+    def drain(self, now: float):
+        self._level = min(self._level, 0.0)
+        self._updated = now
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets shared by all clients of one model.
+
+    Each bucket holds at most one second of its budget, so bursts are smoothed rather
+    than fired all at once. A 429 pauses every caller until the server's retry-after
+    has passed, and empties both buckets so traffic ramps back up at the set rate.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self._buckets = []
+        if requests_per_minute:
+            self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60))
+            self._buckets.append((self.requests, lambda tokens: 1))
+        if tokens_per_minute:
+            self.tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60))
+            self._buckets.append((self.tokens, lambda tokens: tokens))
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Claim one request of `tokens` tokens; returns the seconds to wait before sending it"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            for bucket, amount in self._buckets:
+                wait = max(wait, bucket.take(amount(tokens), now))
+            return max(0.0, wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            for bucket, _ in self._buckets:
+                bucket.drain(now)
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay += retry_after
+    return delay
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    # OpenAI sends retry-after-ms as well as the standard header
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return None
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Tokens a chat or embeddings request will be charged, from its JSON body"""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return 0
+    if not isinstance(body, dict):
+        return 0
+    tokens = 0
+    inputs = body.get("input", [])
+    for item in inputs if isinstance(inputs, list) else [inputs]:
+        # the SDK may send pre-tokenized input as lists of token ids
+        tokens += len(item) if isinstance(item, list) else count_tokens(str(item))
+    for message in body.get("messages", []):
+        content = message.get("content")
+        tokens += count_tokens(content if isinstance(content, str) else json.dumps(content))
+    return tokens + (body.get("max_completion_tokens") or body.get("max_tokens") or 0)
+
+
+class RetryPolicy:
+    """When to send and when to retry a request, shared by the sync and async transports"""
+
+    def __init__(self, limiter: RateLimiter, backend: str, max_retries: int = 6,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        self.limiter = limiter
+        self.backend = backend
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def wait(self, request: httpx.Request) -> float:
+        """Seconds to wait for the rate limits before sending request"""
+        wait = self.limiter.reserve(estimate_tokens(request))
+        RATE_LIMIT_WAIT.observe(wait, backend=self.backend)
+        return wait
+
+    def retry(self, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """Seconds to back off before retrying, or None to hand the response (or error) back.
+
+        response is None when the connection could not be made.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if response is None:
+            API_RETRIES.inc(backend=self.backend, reason="connect")
+            return backoff_delay(attempt, self.base_delay, self.max_delay)
+        if response.status_code not in RETRY_STATUSES:
+            return None
+        API_RETRIES.inc(backend=self.backend, reason=response.status_code)
+        retry_after = _retry_after(response)
+        if response.status_code == 429:
+            self.limiter.pause(retry_after if retry_after is not None else self.base_delay)
+        return backoff_delay(attempt, self.base_delay, self.max_delay, retry_after)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Waits for the rate limits before each request and retries 429s, 5xx and connect errors.
+
+    close() leaves the wrapped transport open, since it is a pool shared with other clients.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            time.sleep(self.policy.wait(request))
+            try:
+                response = self.transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                delay = self.policy.retry(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = self.policy.retry(attempt, response)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """RateLimitedTransport for the async clients"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.policy.wait(request))
+            try:
+                response = await self.transport.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                delay = self.policy.retry(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = self.policy.retry(attempt, response)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def proxy_for(url: str, proxy: Optional[str] = None) -> Optional[str]:
+    """The proxy to reach url through: proxy if given, else the one HTTPS_PROXY/HTTP_PROXY/ALL_PROXY name for it.
+
+    httpx ignores those variables for clients built on an explicit transport, as the
+    shared pools are, so they are resolved here the way the SDK's own client would,
+    NO_PROXY included.
+    """
+    if proxy:
+        return proxy
+    parts = urllib.parse.urlsplit(url)
+    proxies = urllib.request.getproxies()
+    if not proxies or urllib.request.proxy_bypass(parts.hostname or ""):
+        return None
+    return proxies.get(parts.scheme) or proxies.get("all")
+
+
+class ClientRegistry:
+    """Process-wide clients keyed by backend and configuration"""
+
+    _clients: Dict[str, Any] = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def get(key: tuple, create: Callable[[], Any]) -> Any:
+        """The client stored under key, built with create() the first time it is asked for"""
+        key = json.dumps(key, sort_keys=True, default=str)
+        with ClientRegistry._lock:
+            if key not in ClientRegistry._clients:
+                ClientRegistry._clients[key] = create()
+            return ClientRegistry._clients[key]
+
+    @staticmethod
+    def limiter(backend: str, kind: str, model: str, requests_per_minute: Optional[int],
+                tokens_per_minute: Optional[int]) -> RateLimiter:
+        """The RateLimiter every client of one model shares, since the API enforces its limits per model.
+
+        Raises ValueError if the model's limiter was already created with other limits.
+        """
+        limiter = ClientRegistry.get(
+            ("limiter", backend, kind, model), lambda: RateLimiter(requests_per_minute, tokens_per_minute)
+        )
+        if limiter.limits != (requests_per_minute, tokens_per_minute):
+            raise ValueError(
+                f"Conflicting rate limits for {backend} {kind} model {model}: "
+                f"{requests_per_minute} rpm / {tokens_per_minute} tpm requested, "
+                f"{limiter.limits[0]} rpm / {limiter.limits[1]} tpm already in use"
+            )
+        return limiter
+
+    @staticmethod
+    def openai_http_clients(settings: dict, kind: str, default_model: str, requests_per_minute: Optional[int] = None,
+                            tokens_per_minute: Optional[int] = None, max_retries: int = 6) -> dict:
+        """http_client, http_async_client, max_retries and openai_proxy arguments for ChatOpenAI and OpenAIEmbeddings.
+
+        They go after the configured settings, which they override. The connection pools are
+        shared per API host and proxy, and the limiter per model, which is default_model (the
+        client class's own default) when settings do not name one. The SDK's own retries are
+        turned off since the transport does them. The proxy (openai_proxy, OPENAI_PROXY or the
+        standard proxy variables) is set on the pools, and openai_proxy is cleared, since
+        langchain_openai refuses it alongside explicit clients.
+        """
+        base_url = (
+            settings.get("base_url") or settings.get("openai_api_base")
+            or os.environ.get("OPENAI_API_BASE") or os.environ.get("OPENAI_BASE_URL")
+            or "https://api.openai.com/v1"
+        )
+        proxy = proxy_for(base_url, settings.get("openai_proxy") or os.environ.get("OPENAI_PROXY"))
+        model = settings.get("model") or settings.get("model_name") or default_model
+        policy = RetryPolicy(
+            ClientRegistry.limiter("openai", kind, model, requests_per_minute, tokens_per_minute),
+            backend=f"openai_{kind}",
+            max_retries=max_retries
+        )
+        pool = ClientRegistry.get(("pool", base_url, proxy), lambda: httpx.HTTPTransport(proxy=proxy))
+        async_pool = ClientRegistry.get(("async_pool", base_url, proxy), lambda: httpx.AsyncHTTPTransport(proxy=proxy))
+        return {
+            "http_client": httpx.Client(transport=RateLimitedTransport(pool, policy)),
+            "http_async_client": httpx.AsyncClient(transport=AsyncRateLimitedTransport(async_pool, policy)),
+            "max_retries": 0,
+            "openai_proxy": None
+        }
@@ -0,0 +1,131 @@
+import functools
+import re
+from typing import List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken's cl100k_base if it can be loaded (it is downloaded on first use), else None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        # special-token text such as <|endoftext|> in a PDF or question is counted as plain text
+        return len(encoding.encode(text, disallowed_special=()))
+    # offline estimate: one token per word or punctuation mark
+    return len(_TOKEN_RE.findall(text))
+
+def token_offsets(text: str) -> List[int]:
+    """Character offset at which each token of text starts, from the same tokenizer as count_tokens"""
+    encoding = _encoding()
+    if encoding is not None:
+        _, offsets = encoding.decode_with_offsets(encoding.encode(text, disallowed_special=()))
+        return offsets
+    return [m.start() for m in _TOKEN_RE.finditer(text)]
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    ends = [m.end() for m in _TOKEN_RE.finditer(text)]
+    if len(ends) <= max_tokens:
+        return text
+    return text[:ends[max_tokens - 1]] if max_tokens > 0 else ""
+
+def _overlap(previous: str, following: str, limit: int) -> int:
+    """Length of the longest suffix of previous (at most limit chars) that starts following"""
+    tail = previous[-limit:]
+    probe = following[:min(32, len(following))]
+    if not probe:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if following.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+class ContextAssembler:
+    """Turns retrieved chunks into the prompt context.
+
+    Adjacent chunks (consecutive chunk_id on the same page of the same document) are
+    merged with their repeated overlap trimmed, passages that are near-duplicates of a
+    better ranked one are dropped, and the rest is cut to config.context_max_tokens.
+    Passages keep the rank of their best retrieved chunk.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def _key(self, doc):
+        metadata = doc.metadata
+        return metadata.get("document_id", metadata.get("source")), metadata.get("page")
+
+    def _merge(self, docs) -> List[Tuple[int, str]]:
+        """(rank, text) passages with adjacent chunks joined"""
+        passages, indexed, seen = [], [], set()
+        for rank, doc in enumerate(docs):
+            chunk_id = doc.metadata.get("chunk_id")
+            if chunk_id is None:
+                passages.append((rank, doc.page_content))
+            elif (self._key(doc), chunk_id) not in seen:
+                seen.add((self._key(doc), chunk_id))
+                indexed.append((rank, doc))
+        indexed.sort(key=lambda item: (str(self._key(item[1])), item[1].metadata["chunk_id"]))
+
+        run_rank, run_text, previous = None, None, None
+        for rank, doc in indexed:
+            chunk_id = doc.metadata["chunk_id"]
+            if previous is not None and self._key(previous) == self._key(doc) and chunk_id == previous.metadata["chunk_id"] + 1:
+                if "start_index" in doc.metadata and "end_index" in previous.metadata:
+                    # the splitter recorded where each chunk sits in the page
+                    trim = max(0, previous.metadata["end_index"] - doc.metadata["start_index"])
+                else:
+                    # overlap is at most chunk_overlap characters, give the splitter's whitespace some slack
+                    trim = _overlap(run_text, doc.page_content, self.config.chunk_overlap + 16)
+                run_text += doc.page_content[trim:] if trim else "\n" + doc.page_content
+                run_rank = min(run_rank, rank)
+            else:
+                if run_text is not None:
+                    passages.append((run_rank, run_text))
+                run_rank, run_text = rank, doc.page_content
+            previous = doc
+        if run_text is not None:
+            passages.append((run_rank, run_text))
+        return sorted(passages)
+
+    def assemble(self, docs) -> List[str]:
+        """Passages to put in the prompt, best ranked first"""
+        kept, kept_shingles = [], []
+        for _, text in self._merge(docs):
+            shingles = _shingles(text)
+            if any(len(shingles & other) / len(shingles | other) >= self.config.context_dedup_threshold for other in kept_shingles):
+                continue
+            kept.append(text)
+            kept_shingles.append(shingles)
+
+        budget = self.config.context_max_tokens
+        if not budget:
+            return kept
+        passages, used = [], 0
+        for text in kept:
+            # passages are joined by a blank line, about one token
+            tokens = count_tokens(text) + (1 if passages else 0)
+            if used + tokens > budget:
+                remaining = budget - used - (1 if passages else 0)
+                if remaining >= 32:
+                    passages.append(truncate_tokens(text, remaining))
+                break
+            passages.append(text)
+            used += tokens
+        return passages
@@ -1,12 +1,305 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import OllamaEmbeddings
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from langchain_core.embeddings import Embeddings
+from metrics import CACHE_LOOKUPS, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT
 
 class EmbeddingsFactory:
+    # extra backends by embeddings_type, e.g. the offline stand-ins used by bench/
+    _backends: Dict[str, Callable[..., Embeddings]] = {}
+    # backends whose embed_documents vector for a text is its embed_query vector, so queries
+    # can be batched; Ollama's is not, it prefixes documents and queries with different instructions
+    _batchable = {"openai"}
+    # one query batcher per backend configuration, shared by every QASystem in the process
+    _query_batchers: Dict[str, "QueryBatcher"] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(embeddings_type: str, create: Callable[..., Embeddings], batch_queries: bool = False):
+        """Make create(config) the builder for config.embeddings_type == embeddings_type.
+
+        Pass batch_queries=True if the backend's embed_documents gives the same vectors as
+        embed_query, so concurrent queries may be embedded together.
+        """
+        EmbeddingsFactory._backends[embeddings_type] = create
+        if batch_queries:
+            EmbeddingsFactory._batchable.add(embeddings_type)
+        else:
+            EmbeddingsFactory._batchable.discard(embeddings_type)
+
     @staticmethod
     def create_embeddings(config):
+        # backends are imported only when selected, each pulls in a large client library
+        # the built-in backends are shared by every system with the same settings
+        settings = config.embeddings_config or {}
         if config.embeddings_type == "openai":
-            return OpenAIEmbeddings(**config.embeddings_config or {})
+            from langchain_openai import OpenAIEmbeddings
+            from clients import ClientRegistry
+            embeddings = ClientRegistry.get(
+                ("embeddings", config.embeddings_type, settings, config.embeddings_requests_per_minute,
+                 config.embeddings_tokens_per_minute, config.api_max_retries),
+                lambda: OpenAIEmbeddings(**{
+                    **settings,
+                    **ClientRegistry.openai_http_clients(
+                        settings, "embeddings", OpenAIEmbeddings.model_fields["model"].default,
+                        config.embeddings_requests_per_minute, config.embeddings_tokens_per_minute,
+                        config.api_max_retries
+                    )
+                })
+            )
         elif config.embeddings_type == "ollama":
-            return OllamaEmbeddings(**config.embeddings_config or {})
+            from langchain_community.embeddings import OllamaEmbeddings
+            from clients import ClientRegistry
+            embeddings = ClientRegistry.get(
+                ("embeddings", config.embeddings_type, settings), lambda: OllamaEmbeddings(**settings)
+            )
+        elif config.embeddings_type in EmbeddingsFactory._backends:
+            embeddings = EmbeddingsFactory._backends[config.embeddings_type](config)
         else:
-            raise ValueError(f"Unsupported embeddings type: {config.embeddings_type}")
\ No newline at end of file
+            raise ValueError(f"Unsupported embeddings type: {config.embeddings_type}")
+
+        # read from the backend itself, before any wrapper hides its model field
+        model = settings.get("model") or getattr(embeddings, "model", "")
+        if config.query_batch_max_wait > 0 and config.embeddings_type in EmbeddingsFactory._batchable:
+            embeddings = BatchingEmbeddings(embeddings, EmbeddingsFactory._query_batcher(config, embeddings))
+
+        if config.embeddings_cache_path:
+            return CachedEmbeddings(
+                embeddings,
+                namespace=f"{config.embeddings_type}:{model}",
+                path=config.embeddings_cache_path,
+                max_entries=config.embeddings_cache_max_entries
+            )
+        return embeddings
+
+    @staticmethod
+    def _query_batcher(config, backend: Embeddings) -> "QueryBatcher":
+        key = json.dumps(
+            [config.embeddings_type, config.embeddings_config, config.query_batch_max_wait, config.query_batch_max_size],
+            sort_keys=True, default=str
+        )
+        with EmbeddingsFactory._lock:
+            if key not in EmbeddingsFactory._query_batchers:
+                EmbeddingsFactory._query_batchers[key] = QueryBatcher(
+                    backend,
+                    backend_label=config.embeddings_type,
+                    max_wait=config.query_batch_max_wait,
+                    max_size=config.query_batch_max_size
+                )
+            return EmbeddingsFactory._query_batchers[key]
+
+
+class QueryBatcher:
+    """Collects embed_query calls from concurrent requests and embeds them with one embed_documents call.
+
+    While no call is in flight a query is sent at once, so a lone caller pays no wait.
+    Otherwise a batch is sent once it holds max_size queries or its first query has
+    waited max_wait seconds. Up to max_in_flight batches are embedded at once on a thread
+    pool; when all of them are busy, queries keep collecting into the next batch. Callers get
+    the backend's embed_documents vector, so the factory only batches backends for which that
+    is the embed_query vector (OpenAI's, not Ollama's).
+    """
+
+    def __init__(self, backend: Embeddings, backend_label: str, max_wait: float = 0.005, max_size: int = 64,
+                 max_in_flight: int = 8):
+        self.backend = backend
+        self.backend_label = backend_label
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self.max_in_flight = max_in_flight
+        self.batches = 0
+        self.queries = 0
+        # (text, future, time enqueued), oldest first
+        self._pending: List[tuple] = []
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="query-embed")
+        self._in_flight = 0
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0
+        }
+
+    def submit(self, text: str) -> Future:
+        """A future that resolves to text's vector once its batch has been embedded"""
+        future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="query-batcher", daemon=True)
+                self._thread.start()
+            self._pending.append((text, future, time.perf_counter()))
+            # wake the collector when a new batch opens (to start its timer) or fills up
+            if len(self._pending) == 1 or len(self._pending) >= self.max_size:
+                self._condition.notify()
+        return future
+
+    def _collect(self):
+        while True:
+            with self._condition:
+                while not self._pending or self._in_flight >= self.max_in_flight:
+                    self._condition.wait()
+                deadline = self._pending[0][2] + self.max_wait
+                while self._in_flight and len(self._pending) < self.max_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+                self._in_flight += 1
+            self._pool.submit(self._embed, batch)
+
+    def _embed(self, batch: List[tuple]):
+        try:
+            self._send(batch)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def _send(self, batch: List[tuple]):
+        now = time.perf_counter()
+        # callers that gave up (a cancelled request) are dropped from the batch
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        for _, _, enqueued in batch:
+            EMBED_BATCH_WAIT.observe(now - enqueued, backend=self.backend_label)
+        EMBED_BATCH_SIZE.observe(len(batch), backend=self.backend_label)
+        with self._condition:
+            self.batches += 1
+            self.queries += len(batch)
+
+        try:
+            vectors = self.backend.embed_documents([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+
+class BatchingEmbeddings(Embeddings):
+    """Sends queries through a QueryBatcher; documents go straight to the backend"""
+
+    def __init__(self, backend: Embeddings, batcher: QueryBatcher):
+        self.backend = backend
+        self.batcher = batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.backend.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.batcher.submit(text))
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed embedding cache in SQLite, keyed by (backend:model, sha256(text)).
+
+    Lookups are batched, only misses are sent to the backend, and the least recently
+    used vectors are evicted once the cache holds more than max_entries.
+    Queries are passed straight through, since they rarely repeat verbatim.
+    """
+
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, backend: Embeddings, namespace: str, path: str, max_entries: int = 500_000):
+        self.backend = backend
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " namespace TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (namespace, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def _lookup(self, hashes: List[str]) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(hashes), self._LOOKUP_BATCH):
+                batch = hashes[start:start + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE namespace = ? AND text_hash IN ({placeholders})",
+                    [self.namespace, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE namespace = ? AND text_hash IN ({placeholders})",
+                        [now, self.namespace, *batch]
+                    )
+            self._conn.commit()
+        return found
+
+    def _insert(self, vectors: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [(self.namespace, h, array("f", v).tobytes(), now) for h, v in vectors.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = self._lookup(list(set(hashes)))
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        misses = sum(1 for h in hashes if h in missing)
+        self.hits += len(texts) - misses
+        self.misses += misses
+        CACHE_LOOKUPS.inc(len(texts) - misses, cache="embeddings", result="hit")
+        CACHE_LOOKUPS.inc(misses, cache="embeddings", result="miss")
+
+        if missing:
+            computed = dict(zip(missing.keys(), self.backend.embed_documents(list(missing.values()))))
+            self._insert(computed)
+            vectors.update(computed)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.backend.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.backend.aembed_query(text)
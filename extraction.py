@@ -0,0 +1,108 @@
+"""PDF page-text extraction, kept free of langchain imports so worker processes start fast."""
+import contextlib
+import glob
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+import pypdf
+from pypdf import PdfReader
+
+# part of every cache key: a new pypdf, or a change to how text is extracted here, invalidates old entries
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}-1"
+
+
+def file_hash(file_path: str) -> str:
+    """sha256 of the file's bytes, read in 1 MiB blocks"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def count_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def document_info(file_path: str) -> Tuple[dict, List[str]]:
+    """The PDF's document metadata (keys lowercased as PyPDFLoader reports them) and its page labels"""
+    reader = PdfReader(file_path)
+    info = {key.lstrip("/").lower(): str(value) for key, value in (reader.metadata or {}).items()}
+    info["total_pages"] = len(reader.pages)
+    return info, list(reader.page_labels)
+
+
+def extract_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end); runs inside ingestion worker processes"""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def iter_page_texts(file_path: str) -> Iterator[str]:
+    """Extract pages one at a time in this process, reusing a single reader"""
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        yield page.extract_text()
+
+
+class _PageWriter:
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, text: str):
+        self._f.write(json.dumps(text) + "\n")
+
+
+class PageTextCache:
+    """Extracted page text on disk, keyed by PDF content hash and EXTRACTOR_VERSION.
+
+    One gzipped JSON-lines file per PDF: a header with the document info and page
+    labels, then one line per page holding its text.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.{EXTRACTOR_VERSION}.jsonl.gz")
+
+    def load(self, content_hash: str) -> Optional[Tuple[dict, List[str], List[str]]]:
+        """(document info, page labels, page texts), or None if this PDF is not cached"""
+        try:
+            with gzip.open(self._path(content_hash), "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                texts = [json.loads(line) for line in f]
+        except (OSError, EOFError, ValueError):
+            return None
+        if len(texts) != header["info"].get("total_pages", len(texts)):
+            return None
+        return header["info"], header["page_labels"], texts
+
+    def remove(self, content_hash: str):
+        """Delete a PDF's entries, those of older EXTRACTOR_VERSIONs included"""
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(content_hash)}.*.jsonl.gz")):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    @contextlib.contextmanager
+    def writer(self, content_hash: str, info: dict, page_labels: List[str]):
+        """Yields an object whose write(text) appends the next page.
+
+        The entry only becomes visible when the block completes; on an exception (or a
+        generator closed early) the partial file is discarded.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                f.write(json.dumps({"version": EXTRACTOR_VERSION, "info": info, "page_labels": page_labels}) + "\n")
+                yield _PageWriter(f)
+            os.replace(tmp, self._path(content_hash))
+        except BaseException:
+            os.remove(tmp)
+            raise
@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+QUEUED = "queued"
+LOADING = "loading"
+SPLITTING = "splitting"
+EMBEDDING = "embedding"
+READY = "ready"
+FAILED = "failed"
+
+
+class IngestionJob:
+    def __init__(self, document_id: str):
+        self.document_id = document_id
+        self.stage = QUEUED
+        self.chunks_embedded = 0
+        self.total_chunks: Optional[int] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.stage in (READY, FAILED)
+
+    def update(self, stage: str, chunks_embedded: int = None, total_chunks: int = None):
+        """Progress callback handed to QASystem.initialize; total_chunks stays None while streaming"""
+        self.stage = stage
+        if chunks_embedded is not None:
+            self.chunks_embedded = chunks_embedded
+        if total_chunks is not None:
+            self.total_chunks = total_chunks
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+class IngestionQueue:
+    """Runs document ingestion on a bounded pool of worker threads, off the event loop.
+
+    A job is only tracked while it runs: fn must record its outcome elsewhere (the
+    service writes it to the registry) since finished jobs are dropped.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32):
+        self.max_pending = max_pending
+        self.jobs: Dict[str, IngestionJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        return sum(1 for job in self.jobs.values() if not job.done)
+
+    def submit(self, document_id: str, fn: Callable[[IngestionJob], None]) -> IngestionJob:
+        """Queue fn(job); fn reports progress through job.update and raises on failure"""
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise IngestionQueueFull(f"Ingestion queue is full ({self.max_pending} documents pending)")
+            job = IngestionJob(document_id)
+            self.jobs[document_id] = job
+
+        def run():
+            try:
+                fn(job)
+                job.update(READY)
+            except Exception as e:
+                print(f"Ingestion of {document_id} failed: {e}")
+                job.error = str(e)
+                job.update(FAILED)
+            with self._lock:
+                # unless the id was resubmitted in the meantime
+                if self.jobs.get(document_id) is job:
+                    del self.jobs[document_id]
+
+        job.future = self._executor.submit(run)
+        return job
+
+    def get(self, document_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(document_id)
+
+    def remove(self, document_id: str):
+        job = self.jobs.pop(document_id, None)
+        if job is not None and job.future is not None:
+            job.future.cancel()
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
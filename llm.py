@@ -1,14 +1,40 @@
-from langchain_openai import ChatOpenAI
-from langchain_community.llms.ollama import Ollama
+from typing import Callable, Dict
 
 from config import QAConfig
 
 class LLMFactory:
+    # extra backends by llm_type, e.g. the offline stand-ins used by bench/
+    _backends: Dict[str, Callable] = {}
+
+    @staticmethod
+    def register(llm_type: str, create: Callable):
+        """Make create(config) the builder for config.llm_type == llm_type"""
+        LLMFactory._backends[llm_type] = create
+
     @staticmethod
     def create_llm(config: QAConfig):
+        # backends are imported only when selected, each pulls in a large client library
+        # the built-in backends are shared by every system with the same settings
+        settings = config.llm_config or {}
         if config.llm_type == "openai":
-            return ChatOpenAI(**config.llm_config or {})
+            from langchain_openai import ChatOpenAI
+            from clients import ClientRegistry
+            return ClientRegistry.get(
+                ("llm", config.llm_type, settings, config.llm_requests_per_minute,
+                 config.llm_tokens_per_minute, config.api_max_retries),
+                lambda: ChatOpenAI(**{
+                    **settings,
+                    **ClientRegistry.openai_http_clients(
+                        settings, "llm", ChatOpenAI.model_fields["model_name"].default,
+                        config.llm_requests_per_minute, config.llm_tokens_per_minute, config.api_max_retries
+                    )
+                })
+            )
         elif config.llm_type == "ollama":
-            return Ollama(**config.llm_config or {})
+            from langchain_community.llms.ollama import Ollama
+            from clients import ClientRegistry
+            return ClientRegistry.get(("llm", config.llm_type, settings), lambda: Ollama(**settings))
+        elif config.llm_type in LLMFactory._backends:
+            return LLMFactory._backends[config.llm_type](config)
         else:
             raise ValueError(f"Unsupported LLM type: {config.llm_type}")
\ No newline at end of file
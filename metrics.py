@@ -0,0 +1,138 @@
+import bisect
+import contextlib
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_metrics = []
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=_DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # per label set: (counts per bucket, non-cumulative with +Inf last, sum)
+        self._values: Dict[Tuple[str, ...], tuple] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+                yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+                yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+STAGE_SECONDS = Histogram(
+    "qa_stage_seconds",
+    "Time spent per pipeline stage (pdf_load, split, embed, vector_insert, retrieval, prompt_build, llm).",
+    ("stage", "backend")
+)
+TOKENS = Counter("qa_tokens_total", "LLM tokens by kind (prompt, completion).", ("kind", "backend"))
+CACHE_LOOKUPS = Counter("qa_cache_lookups_total", "Cache lookups by cache (answer, embeddings, page_text) and result.", ("cache", "result"))
+EMBED_BATCH_SIZE = Histogram(
+    "qa_query_embed_batch_size",
+    "Queries per embeddings call made by the query micro-batcher.",
+    ("backend",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EMBED_BATCH_WAIT = Histogram(
+    "qa_query_embed_batch_wait_seconds",
+    "Time a query waited for its micro-batch to be sent.",
+    ("backend",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+API_RETRIES = Counter("qa_api_retries_total", "Retried LLM/embeddings API calls by reason (status code or connect).", ("backend", "reason"))
+RATE_LIMIT_WAIT = Histogram(
+    "qa_rate_limit_wait_seconds",
+    "Time an LLM/embeddings API call waited for the client-side rate limiter.",
+    ("backend",),
+    buckets=(0, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+HTTP_SECONDS = Histogram("http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+
+# stage -> seconds for the request being served, when its caller asked for a breakdown
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def record_stage(stage: str, backend: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage, backend=backend)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextlib.contextmanager
+def timed(stage: str, backend: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, backend, time.perf_counter() - start)
+
+def timed_iter(iterable, stage: str, backend: str):
+    """Yield from iterable, timing only the work done to produce each item"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record_stage(stage, backend, time.perf_counter() - start)
+        yield item
+
+@contextlib.contextmanager
+def collect_timings():
+    """Collect the stage timings recorded by this task (and tasks it starts) into the yielded dict"""
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
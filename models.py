@@ -7,22 +7,62 @@ class DocumentMetadata(BaseModel):
     filename: str
     upload_timestamp: datetime = Field(default_factory=datetime.utcnow)
     document_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    content_hash: Optional[str] = None
 
 class QAConfig(BaseModel):
     source_file_path: str = "source_data.pdf"
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    # "token" (chunk_tokens/chunk_overlap_tokens) or "recursive_character" (chunk_size/chunk_overlap characters)
+    text_splitter: str = "token"
+    chunk_tokens: int = 256
+    chunk_overlap_tokens: int = 48
     vector_store_type: str = "chroma"
     vector_store_path: str = "db"
+    collection_name: str = "langchain"
+    vector_quantization: str = "float32"
+    # int8 scales are fitted on this many rows, held back until they are all embedded
+    quantization_fit_size: int = 4096
+    rerank_candidates: int = 0
+    faiss_index_type: str = "flat"
+    faiss_train_size: int = 20_000
+    faiss_nlist: int = 1024
+    faiss_nprobe: int = 16
+    faiss_hnsw_m: int = 32
+    faiss_ef_search: int = 64
+    faiss_pq_m: int = 16
+    faiss_pq_bits: int = 8
     llm_type: str = "openai"
     llm_config: Dict[str, Any] = None
     embeddings_type: str = "openai"
     embeddings_config: Dict[str, Any] = None
+    embeddings_cache_path: Optional[str] = None
+    embeddings_cache_max_entries: int = 500_000
+    extraction_cache_path: Optional[str] = None
+    # concurrent embed_query calls are sent as one embed_documents call (openai only); max_wait 0 turns this off
+    query_batch_max_wait: float = 0.005
+    query_batch_max_size: int = 64
+    # client-side limits for the openai backends, shared by all clients of a model; None means no limit
+    llm_requests_per_minute: Optional[int] = None
+    llm_tokens_per_minute: Optional[int] = None
+    embeddings_requests_per_minute: Optional[int] = None
+    embeddings_tokens_per_minute: Optional[int] = None
+    # retries of 429s, 5xx and connection errors, with jittered exponential backoff
+    api_max_retries: int = 6
     prompt_template: str = ""
+    context_assembly: bool = True
+    context_max_tokens: int = 3000
+    context_dedup_threshold: float = 0.9
+    ingest_batch_size: int = 64
+    ingest_streaming: bool = False
+    ingest_workers: int = 4
+    ingest_pages_per_task: int = 8
 
 class QuestionRequest(BaseModel):
     question: str
     document_id: str
+    # add the seconds spent per stage (embed, retrieval, prompt_build, llm) to the response metadata
+    include_timings: bool = False
 
 class SourceDocument(BaseModel):
     content: str
@@ -35,6 +75,29 @@ class QuestionResponse(BaseModel):
     question_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class BatchQuestionRequest(BaseModel):
+    items: List[QuestionRequest]
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
+
+class BatchQuestionResult(BaseModel):
+    document_id: str
+    question: str
+    status: str
+    status_code: int = 200
+    response: Optional[QuestionResponse] = None
+    error: Optional[str] = None
+
+class BatchQuestionResponse(BaseModel):
+    results: List[BatchQuestionResult]
+
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    filename: str
+    stage: str
+    chunks_embedded: int = 0
+    total_chunks: Optional[int] = None
+    error: Optional[str] = None
+
 class DocumentUploadResponse(BaseModel):
     document_id: str
     filename: str
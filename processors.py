@@ -1,32 +1,164 @@
+import contextlib
+import hashlib
+import itertools
+import multiprocessing
 import os
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders.pdf import PyPDFLoader
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
 from config import QAConfig, Document, DocumentChunk
+from context import count_tokens
+from extraction import PageTextCache, count_pages, document_info, extract_pages, file_hash, iter_page_texts
+from metrics import CACHE_LOOKUPS, timed, timed_iter
+from splitters import TokenChunker
+
+
+def page_hash(text: str) -> str:
+    """Short hash of a page's text; an update keeps the chunks of pages whose hash is unchanged"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _pool_context():
+    # forking a process that already runs threads (Chroma, HTTP clients) can deadlock
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
 
 class DocumentProcessor:
     def __init__(self, config: QAConfig):
         self.config = config
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.chunk_size,
-            chunk_overlap=config.chunk_overlap
-        )
+        if config.text_splitter == "token":
+            self.text_splitter = TokenChunker(config.chunk_tokens, config.chunk_overlap_tokens)
+        elif config.text_splitter == "recursive_character":
+            # imported on first use: langchain_text_splitters loads langchain_core.runnables and langsmith
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=config.chunk_size,
+                chunk_overlap=config.chunk_overlap
+            )
+        else:
+            raise ValueError(f"Unsupported text splitter: {config.text_splitter}")
+        # extracted page text by PDF hash, so re-chunking or re-embedding a file skips PDF parsing
+        self.page_cache = PageTextCache(config.extraction_cache_path) if config.extraction_cache_path else None
 
     def load_documents(self, file_path: str) -> List[Document]:
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-        return [Document(str(doc.page_content), doc.metadata) for doc in documents]
+        source_doc_id = file_hash(file_path)
+        cached = self._cached_pages(file_path, source_doc_id)
+        if cached is not None:
+            return cached
+        with timed("pdf_load", "pypdf"):
+            return list(self._pages(file_path, source_doc_id, iter_page_texts(file_path)))
+
+    def _page_metadata(self, file_path: str, source_doc_id: str, info: dict, page_labels: List[str]):
+        # the same keys PyPDFLoader reports, plus source_doc_id
+        def metadata(page: int) -> dict:
+            label = page_labels[page] if page < len(page_labels) else str(page + 1)
+            return {**info, "source": file_path, "page": page, "page_label": label, "source_doc_id": source_doc_id}
+        return metadata
+
+    def _cached_pages(self, file_path: str, source_doc_id: str) -> Optional[List[Document]]:
+        """The pages from the extraction cache, or None when it is off or misses"""
+        if self.page_cache is None:
+            return None
+        with timed("pdf_load", "page_cache"):
+            cached = self.page_cache.load(source_doc_id)
+        CACHE_LOOKUPS.inc(cache="page_text", result="miss" if cached is None else "hit")
+        if cached is None:
+            return None
+        info, page_labels, texts = cached
+        metadata = self._page_metadata(file_path, source_doc_id, info, page_labels)
+        return [Document(text, metadata(page)) for page, text in enumerate(texts)]
+
+    def _pages(self, file_path: str, source_doc_id: str, texts: Iterable[str]) -> Iterator[Document]:
+        """Documents for freshly extracted page texts, saved to the extraction cache as they pass"""
+        info, page_labels = document_info(file_path)
+        metadata = self._page_metadata(file_path, source_doc_id, info, page_labels)
+        if self.page_cache is None:
+            cache_writer = contextlib.nullcontext()
+        else:
+            cache_writer = self.page_cache.writer(source_doc_id, info, page_labels)
+        with cache_writer as cache:
+            for page, text in enumerate(texts):
+                if cache is not None:
+                    cache.write(text)
+                yield Document(text, metadata(page))
+
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """Yield pages in order while later pages are extracted in a process pool.
+
+        At most 2 * ingest_workers page ranges are in flight, so memory stays
+        bounded regardless of document size. Cached pages skip extraction entirely.
+        """
+        source_doc_id = file_hash(file_path)
+        cached = self._cached_pages(file_path, source_doc_id)
+        if cached is not None:
+            yield from cached
+            return
+
+        if self.config.ingest_workers <= 1:
+            yield from self._pages(file_path, source_doc_id, timed_iter(iter_page_texts(file_path), "pdf_load", "pypdf"))
+            return
+
+        num_pages = count_pages(file_path)
+        per_task = self.config.ingest_pages_per_task
+        ranges = [(start, min(start + per_task, num_pages)) for start in range(0, num_pages, per_task)]
+        if len(ranges) <= 1:
+            yield from self._pages(file_path, source_doc_id, timed_iter(iter_page_texts(file_path), "pdf_load", "pypdf"))
+            return
+
+        def pooled_texts():
+            with ProcessPoolExecutor(max_workers=self.config.ingest_workers, mp_context=_pool_context()) as pool:
+                pending = iter(ranges)
+                in_flight = [
+                    pool.submit(extract_pages, file_path, start, end)
+                    for start, end in itertools.islice(pending, 2 * self.config.ingest_workers)
+                ]
+                while in_flight:
+                    future = in_flight.pop(0)
+                    # only the time ingestion actually waits on the pool
+                    with timed("pdf_load", "pypdf_pool"):
+                        texts = future.result()
+                    for next_start, next_end in itertools.islice(pending, 1):
+                        in_flight.append(pool.submit(extract_pages, file_path, next_start, next_end))
+                    yield from texts
+
+        yield from self._pages(file_path, source_doc_id, pooled_texts())
 
     def split_documents(self, documents: List[Document]) -> List[DocumentChunk]:
-        chunks = []
+        return list(self.iter_chunks(documents))
+
+    def _spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, tokens) of each chunk of text"""
+        if self.config.text_splitter == "token":
+            return self.text_splitter.spans(text)
+        spans, position = [], 0
+        for split in self.text_splitter.split_text(text):
+            # splits come out in order; overlapping ones start after the previous start
+            start = text.find(split, position)
+            if start < 0:
+                start = position
+            position = start + 1
+            spans.append((start, start + len(split), count_tokens(split)))
+        return spans
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[DocumentChunk]:
+        """Split each document as it arrives instead of waiting for the whole file.
+
+        Chunks record their page's metadata (source_doc_id is the file's sha256), their
+        start_index/end_index character offsets in the page and their token_count.
+        """
         for doc in documents:
-            splits = self.text_splitter.split_text(doc.content)
-            for i, split in enumerate(splits):
+            with timed("split", self.config.text_splitter):
+                spans = self._spans(doc.content)
+            digest = page_hash(doc.content)
+            for i, (start, end, tokens) in enumerate(spans):
                 metadata = {
                     **doc.metadata,
                     "chunk_id": i,
-                    "source_doc_id": len(chunks)
+                    "start_index": start,
+                    "end_index": end,
+                    "token_count": tokens,
+                    "page_hash": digest,
+                    # stable across re-indexing as long as the page's text is unchanged
+                    "chunk_key": f"{doc.metadata.get('page')}:{digest}:{i}"
                 }
-                chunks.append(DocumentChunk(split, metadata))
-        return chunks
-
+                yield DocumentChunk(doc.content[start:end], metadata)
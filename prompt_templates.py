@@ -1,7 +1,7 @@
-from langchain.prompts import PromptTemplate
-
 class QAPromptTemplate:
     def __init__(self) -> None:
+        # langchain_core.prompts is slow to import; defer it until a QASystem is built
+        from langchain_core.prompts import PromptTemplate
         self.prompts = dict()
 
         quantum_analyst_template =  PromptTemplate(
@@ -1,60 +1,277 @@
+import asyncio
+import copy
+from typing import Dict, List, Optional
+
 from stores import VectorStoreFactory
-from embeddings import EmbeddingsFactory
 
 from config import QAConfig, QAResponse, Document
 from llm import LLMFactory
 
 from processors import DocumentProcessor
 
-from langchain.chains import RetrievalQA
 from prompt_templates import QAPromptTemplate
+from jobs import LOADING, SPLITTING, EMBEDDING
+from context import ContextAssembler, count_tokens
+from metrics import TOKENS, timed
 
 class QASystem:
-    def __init__(self, config: QAConfig):
+    def __init__(self, config: QAConfig, document_id: str = None):
         self.config = config
+        # set when the vector store is shared by many documents; chunks are tagged and retrieval filtered by it
+        self.document_id = document_id
+        # langchain_core.embeddings pulls in langsmith; load it with the first system, not at import
+        from embeddings import EmbeddingsFactory
         self.doc_processor = DocumentProcessor(config)
         self.embeddings = EmbeddingsFactory.create_embeddings(config)
         self.vector_store = VectorStoreFactory.create_vector_store(config, self.embeddings)
         self.llm = LLMFactory.create_llm(config)
-        self.qa_prompt = QAPromptTemplate().get_prompt(config.prompt_template)
+        # same fallback RetrievalQA applies when no named prompt is configured
+        self.qa_prompt = QAPromptTemplate().get_prompt(config.prompt_template) or self._default_prompt()
+        self.context_assembler = ContextAssembler(config)
+        self._retriever = None
     
 
-    def initialize(self, file_path: str = None):
-        if self.vector_store.load_existing():
+    def _default_prompt(self):
+        from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+        return PROMPT_SELECTOR.get_prompt(self.llm)
+
+    def for_document(self, document_id: str) -> "QASystem":
+        """A view scoped to one document that shares this system's store, LLM and embeddings clients"""
+        view = copy.copy(self)
+        view.document_id = document_id
+        view._retriever = None
+        return view
+
+    def _is_indexed(self) -> bool:
+        if self.document_id is None:
+            return self.vector_store.load_existing()
+        if self.vector_store.store is None:
+            self.vector_store.load_existing()
+        return self.vector_store.has_document(self.document_id)
+
+    def _tag(self, chunks):
+        for chunk in chunks:
+            if self.document_id is not None:
+                chunk.metadata["document_id"] = self.document_id
+            yield chunk
+
+    def initialize(self, file_path: str = None, on_progress=None):
+        """Load the existing index or build it from file_path.
+
+        on_progress(stage, chunks_embedded=None, total_chunks=None) is called as ingestion advances.
+        """
+        # the cached retriever is bound to the previous store
+        self._retriever = None
+        if self._is_indexed():
             print("Loaded existing vector store")
             return
 
         if not file_path:
             raise ValueError("No existing vector store found and no file path provided")
 
+        progress = on_progress or (lambda *args, **kwargs: None)
         print("Processing new documents")
+        if self.config.ingest_streaming:
+            # pages are parsed in worker processes while earlier batches are embedded
+            progress(EMBEDDING, 0)
+            pages = self.doc_processor.iter_pages(file_path)
+            chunks = self._tag(self.doc_processor.iter_chunks(pages))
+        else:
+            progress(LOADING)
+            documents = self.doc_processor.load_documents(file_path)
+            progress(SPLITTING)
+            chunks = list(self._tag(self.doc_processor.split_documents(documents)))
+            progress(EMBEDDING, 0, len(chunks))
+        self.vector_store.store_documents(
+            chunks,
+            on_progress=lambda done, total: progress(EMBEDDING, done, total)
+        )
+        if hasattr(self.embeddings, "stats"):
+            print(f"Embedding cache: {self.embeddings.stats()}")
+
+    def update(self, file_path: str, on_progress=None) -> dict:
+        """Bring the index up to date with a revised file_path, re-embedding only changed pages.
+
+        Every page is split (cheap next to embedding) to get the store ids its chunks
+        should have, and is re-embedded unless all of them are stored, so a page left
+        half-written by a failed run is completed. Stored chunks that belong to no current
+        page are deleted. An empty index is simply built. Returns the page and chunk
+        counts of the diff.
+        """
+        self._retriever = None
+        if self.vector_store.store is None:
+            self.vector_store.load_existing()
+        progress = on_progress or (lambda *args, **kwargs: None)
+
+        progress(LOADING)
         documents = self.doc_processor.load_documents(file_path)
-        chunks = self.doc_processor.split_documents(documents)
-        self.vector_store.store_documents(chunks)
+        stored = set(self.vector_store.chunk_metadata(self.document_id))
 
-    def get_qa_chain(self):
-        retriever = self.vector_store.get_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}
-        )
-        
-        return RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=retriever,
-            chain_type_kwargs={"prompt": self.qa_prompt},
-            return_source_documents=True
+        progress(SPLITTING)
+        pages: Dict[tuple, list] = {}
+        for chunk in self._tag(self.doc_processor.split_documents(documents)):
+            pages.setdefault((chunk.metadata.get("page"), chunk.metadata.get("page_hash")), []).append(chunk)
+        expected = {key: {self.vector_store.chunk_id(chunk.metadata) for chunk in page} for key, page in pages.items()}
+        changed = [key for key in pages if not expected[key] <= stored]
+        chunks = [chunk for key in changed for chunk in pages[key]]
+        stale = list(stored.difference(*expected.values()))
+        progress(EMBEDDING, 0, len(chunks))
+        # new chunks go in before stale ones are removed, so a changed page never drops out of retrieval
+        self.vector_store.upsert_documents(
+            chunks,
+            on_progress=lambda done, total: progress(EMBEDDING, done, total)
         )
+        self.vector_store.delete(stale)
+        stats = {
+            "pages": len(documents),
+            "pages_changed": len(changed),
+            "chunks_added": len(chunks),
+            "chunks_removed": len(stale)
+        }
+        print(f"Updated index: {stats}")
+        return stats
+
+    def _search_kwargs(self) -> dict:
+        search_kwargs = {"k": 5}
+        if self.document_id is not None:
+            search_kwargs["filter"] = {"document_id": self.document_id}
+        return search_kwargs
+
+    def get_retriever(self):
+        if self._retriever is None:
+            self._retriever = self.vector_store.get_retriever(
+                search_type="similarity",
+                search_kwargs=self._search_kwargs()
+            )
+        return self._retriever
+
+    def embed_question(self, question: str) -> List[float]:
+        with timed("embed", self.config.embeddings_type):
+            return self.embeddings.embed_query(question)
+
+    async def aembed_question(self, question: str) -> List[float]:
+        with timed("embed", self.config.embeddings_type):
+            return await self.embeddings.aembed_query(question)
+
+    async def aembed_questions(self, questions: List[str]) -> List[List[float]]:
+        """Query embeddings of many questions, taken concurrently so the query batcher can merge them"""
+        with timed("embed", self.config.embeddings_type):
+            return list(await asyncio.gather(*(self.embeddings.aembed_query(question) for question in questions)))
+
+    def search(self, embedding: List[float]):
+        with timed("retrieval", self.config.vector_store_type):
+            return self.vector_store.similarity_search_by_vector(embedding, **self._search_kwargs())
 
     def query(self, question: str) -> QAResponse:
-        qa_chain = self.get_qa_chain()
-        result = qa_chain.invoke(question)
-        
+        docs = self.search(self.embed_question(question))
+        prompt, tokens = self._build_prompt(question, docs)
+        with timed("llm", self.config.llm_type):
+            result = self.llm.invoke(prompt)
+        return self._to_response(question, getattr(result, "content", result), docs, tokens)
+
+    async def aquery(self, question: str, embedding: Optional[List[float]] = None) -> QAResponse:
+        """Async retrieval and LLM call, so the event loop stays free while waiting on the backends.
+
+        Pass the question's embedding when the caller already has it to skip embedding it again.
+        """
+        if embedding is None:
+            embedding = await self.aembed_question(question)
+        return await self.agenerate(question, await self.asearch(embedding))
+
+    async def astream(self, question: str, embedding: Optional[List[float]] = None):
+        """Yield ("sources", [Document]) once, then ("token", str) as the LLM generates.
+
+        Uses the same prompt as query/aquery.
+        """
+        if embedding is None:
+            embedding = await self.aembed_question(question)
+        docs = await self.asearch(embedding)
+        yield "sources", [Document(doc.page_content, doc.metadata) for doc in docs]
+
+        prompt, tokens = self._build_prompt(question, docs)
+        answer = []
+        with timed("llm", self.config.llm_type):
+            async for chunk in self.llm.astream(prompt):
+                # chat models stream message chunks, plain LLMs (Ollama) stream strings
+                token = getattr(chunk, "content", chunk)
+                if token:
+                    answer.append(token)
+                    yield "token", token
+        self._count_tokens(tokens, "".join(answer))
+
+    def _build_prompt(self, question: str, docs):
+        """The LLM prompt and its token counts with every retrieved chunk stuffed in vs after context assembly"""
+        with timed("prompt_build", "context_assembly" if self.config.context_assembly else "stuff"):
+            return self._format_prompt(question, docs)
+
+    def _format_prompt(self, question: str, docs):
+        stuffed = self.qa_prompt.format_prompt(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=question
+        )
+        if not self.config.context_assembly:
+            tokens = count_tokens(stuffed.to_string())
+            return stuffed, {"prompt_tokens_before": tokens, "prompt_tokens_after": tokens}
+
+        prompt = self.qa_prompt.format_prompt(
+            context="\n\n".join(self.context_assembler.assemble(docs)),
+            question=question
+        )
+        return prompt, {
+            "prompt_tokens_before": count_tokens(stuffed.to_string()),
+            "prompt_tokens_after": count_tokens(prompt.to_string())
+        }
+
+    async def asearch(self, embedding: List[float]):
+        """Retrieve by a precomputed query embedding, with the same k and filter as the retriever"""
+        with timed("retrieval", self.config.vector_store_type):
+            return await self.vector_store.asimilarity_search_by_vector(embedding, **self._search_kwargs())
+
+    async def agenerate(self, question: str, docs) -> QAResponse:
+        """Answer from already retrieved documents"""
+        prompt, tokens = self._build_prompt(question, docs)
+        with timed("llm", self.config.llm_type):
+            result = await self.llm.ainvoke(prompt)
+        return self._to_response(question, getattr(result, "content", result), docs, tokens)
+
+    async def abatch_query(
+        self,
+        questions: List[str],
+        max_concurrency: int = 8,
+        embeddings: Optional[List[List[float]]] = None,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> list:
+        """Answer many questions: batched query embeddings, concurrent searches, bounded LLM concurrency.
+
+        Returns a QAResponse or the raised exception for each question, in order.
+        Pass embeddings to reuse vectors computed by the caller, and semaphore to
+        share one LLM concurrency limit across several calls.
+        """
+        if embeddings is None:
+            embeddings = await self.aembed_questions(questions)
+        semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+
+        async def answer(question, embedding):
+            docs = await self.asearch(embedding)
+            async with semaphore:
+                return await self.agenerate(question, docs)
+
+        return await asyncio.gather(
+            *(answer(question, embedding) for question, embedding in zip(questions, embeddings)),
+            return_exceptions=True
+        )
+
+    def _count_tokens(self, tokens: dict, answer: str):
+        TOKENS.inc(tokens["prompt_tokens_after"], kind="prompt", backend=self.config.llm_type)
+        TOKENS.inc(count_tokens(answer), kind="completion", backend=self.config.llm_type)
+
+    def _to_response(self, question: str, answer: str, docs, tokens: dict) -> QAResponse:
+        self._count_tokens(tokens, answer)
         return QAResponse(
-            answer=result['result'],
+            answer=answer,
             source_documents=[
                 Document(doc.page_content, doc.metadata)
-                for doc in result['source_documents']
+                for doc in docs
             ],
-            metadata={"query": question}
-        )
\ No newline at end of file
+            metadata={"query": question, **tokens}
+        )
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from models import DocumentMetadata
+
+PROCESSING = "processing"
+
+
+class DocumentRegistry:
+    """SQLite record of uploaded documents and the indexes they point at, so a restart loses nothing.
+
+    Several documents may reference the same index (same content hash).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS indexes (
+                content_hash TEXT PRIMARY KEY,
+                vector_store_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                upload_timestamp TEXT NOT NULL,
+                content_hash TEXT NOT NULL REFERENCES indexes (content_hash)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def load_documents(self) -> Dict[str, DocumentMetadata]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, filename, upload_timestamp, content_hash FROM documents"
+            ).fetchall()
+        return {
+            row[0]: DocumentMetadata(document_id=row[0], filename=row[1], upload_timestamp=row[2], content_hash=row[3])
+            for row in rows
+        }
+
+    def add_document(self, metadata: DocumentMetadata):
+        self._execute(
+            "INSERT OR REPLACE INTO documents (document_id, filename, upload_timestamp, content_hash) VALUES (?, ?, ?, ?)",
+            (metadata.document_id, metadata.filename, metadata.upload_timestamp.isoformat(), metadata.content_hash)
+        )
+
+    def delete_document(self, document_id: str):
+        self._execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+
+    def add_index(self, content_hash: str, vector_store_path: str):
+        self._execute(
+            "INSERT OR REPLACE INTO indexes (content_hash, vector_store_path, status, error) VALUES (?, ?, ?, NULL)",
+            (content_hash, vector_store_path, PROCESSING)
+        )
+
+    def set_index_status(self, content_hash: str, status: str, error: str = None):
+        self._execute("UPDATE indexes SET status = ?, error = ? WHERE content_hash = ?", (status, error, content_hash))
+
+    def get_index(self, content_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector_store_path, status, error FROM indexes WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"vector_store_path": row[0], "status": row[1], "error": row[2]}
+
+    def list_indexes(self, status: str = None) -> List[str]:
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute("SELECT content_hash FROM indexes").fetchall()
+            else:
+                rows = self._conn.execute("SELECT content_hash FROM indexes WHERE status = ?", (status,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_index(self, content_hash: str):
+        self._execute("DELETE FROM indexes WHERE content_hash = ?", (content_hash,))
@@ -0,0 +1,20 @@
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+
+class StoreRetriever(BaseRetriever):
+    """LangChain retriever over a stores vector store's own search, with its k and document_id filter"""
+
+    vector_store: Any
+    k: int = 5
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[LCDocument]:
+        embedding = self.vector_store.embeddings.embed_query(query)
+        return self.vector_store.similarity_search_by_vector(embedding, k=self.k, filter=self.filter)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> List[LCDocument]:
+        embedding = await self.vector_store.embeddings.aembed_query(query)
+        return await self.vector_store.asimilarity_search_by_vector(embedding, k=self.k, filter=self.filter)
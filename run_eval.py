@@ -1,141 +1,229 @@
-from qa_system import QASystem
-from config import QAConfig
-from dotenv import load_dotenv
-import os
+"""Evaluate the QA system with RAGAS on questions generated from the source PDF.
 
-from langchain_openai import ChatOpenAI
+Runs are resumable. Generated questions, answers and metric scores are appended to
+JSONL checkpoints in the run directory (one JSON object per line, like requests.jsonl),
+and a rerun skips every item that is already there.
 
-load_dotenv()
-
-from ragas import evaluate
-from ragas.metrics import (
-    ContextRecall,
-    ContextPrecision,
-    AnswerRelevancy,
-    Faithfulness,
-)
+Usage: python run_eval.py [--pdf source_data.pdf] [--questions 5] [--questions-per-batch 5] [--chunks-per-batch 4]
+                          [--max-concurrency 8] [--metric-batch-size 8] [--metric-concurrency 4] [--run-dir eval_runs/latest]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Dict, Any
 
-from datasets import Dataset
-from typing import List, Dict, Any, Optional
 import pandas as pd
-import json
-from datetime import datetime
-from pathlib import Path
-from langchain.prompts import PromptTemplate
+from dotenv import load_dotenv
 from langchain.chains import LLMChain
-from langchain_community.document_loaders.pdf import PyPDFLoader
+from langchain_core.prompts import PromptTemplate
 
-from typing import List, Dict, Any, Optional
-    
-from langchain.document_loaders import PyPDFLoader
-from typing import List, Dict, Any, Optional
-import pandas as pd
+from config import QAConfig, Document, DocumentChunk
+from qa_system import QASystem
 
-class QAEvaluator:
-    def __init__(self, qa_system, llm):
-        self.qa_system = qa_system
-        self.dataset_generator = DatasetGenerator(llm)
-        self.metrics = {
-            'context_recall': ContextRecall(),
-            'context_precision': ContextPrecision(),
-            'answer_relevancy': AnswerRelevancy(),
-            'faithfulness': Faithfulness()
-        }
+METRIC_NAMES = ["context_recall", "context_precision", "answer_relevancy", "faithfulness"]
+
+
+@dataclass
+class EvalConfig:
+    number_of_questions: int = 5
+    # questions generated per LLM call, from this many chunks
+    questions_per_batch: int = 5
+    chunks_per_batch: int = 4
+    # LLM calls in flight, both generating and answering questions
+    max_concurrency: int = 8
+    # items per RAGAS evaluate() call, and how many of those calls run in parallel
+    metric_batch_size: int = 8
+    metric_concurrency: int = 4
+    run_directory: str = os.path.join("eval_runs", "latest")
+
+
+def read_jsonl(path: str) -> List[dict]:
+    """Records in a checkpoint file; a line cut short by a crash is ignored"""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def append_jsonl(path: str, records: List[dict]):
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
 
 
 class QAEvaluator:
-    def __init__(self, qa_system, llm, document_path, eval_config):
+    def __init__(self, qa_system, llm, document_path, eval_config: EvalConfig):
         self.qa_system = qa_system
-        self.dataset_generator = DatasetGenerator(llm)
+        self.dataset_generator = DatasetGenerator(
+            llm,
+            chunks_per_batch=eval_config.chunks_per_batch,
+            questions_per_batch=eval_config.questions_per_batch,
+            max_concurrency=eval_config.max_concurrency
+        )
         self.document_path = document_path
         self.eval_config = eval_config
-        self.metrics = {
-            'context_recall': ContextRecall(),
-            'context_precision': ContextPrecision(),
-            'answer_relevancy': AnswerRelevancy(),
-            'faithfulness': Faithfulness()
-        }
+        os.makedirs(eval_config.run_directory, exist_ok=True)
+
+    def _checkpoint(self, name: str) -> str:
+        return os.path.join(self.eval_config.run_directory, name)
+
+    def get_metrics(self) -> list:
+        """New metric instances on every call.
+
+        ragas.evaluate sets and then clears the metrics' llm and embeddings, so batches
+        scored at the same time must not share them.
+        """
+        from ragas.metrics import AnswerRelevancy, ContextPrecision, ContextRecall, Faithfulness
+        return [ContextRecall(), ContextPrecision(), AnswerRelevancy(), Faithfulness()]
 
     def extract_text_from_pdf(self) -> List[Dict[str, str]]:
-        """Extract text and metadata from a PDF file using LangChain PyPDFLoader."""
-        loader = PyPDFLoader(self.document_path)
-        pages = loader.load_and_split()
+        """Page text and metadata, from the QA system's extraction cache when the PDF was parsed before."""
+        pages = self.qa_system.doc_processor.load_documents(self.document_path)
         documents = [
             {
-                "content": page.page_content,
+                "content": page.content,
                 "metadata": {"source": self.document_path, "page": page.metadata["page"]}
             }
             for page in pages
         ]
         return documents
 
-    def evaluate(self) -> Dict[str, Any]:
+    def load_or_generate_questions(self) -> List[Dict[str, str]]:
+        """Questions from questions.jsonl, generated and saved there on the first run"""
+        path = self._checkpoint("questions.jsonl")
+        items = read_jsonl(path)
+        if items:
+            print(f"Resuming with {len(items)} saved questions")
+            return items
+
+        pages = [Document(page["content"], page["metadata"]) for page in self.extract_text_from_pdf()]
+        chunks = self.qa_system.doc_processor.split_documents(pages)
+        generated = self.dataset_generator.generate_questions(chunks, self.eval_config.number_of_questions)
+        items = [
+            {"item_id": f"q-{i:03d}", "question": item["question"], "ground_truth": item["ground_truth"], "pages": item["pages"]}
+            for i, item in enumerate(generated, 1)
+        ]
+        append_jsonl(path, items)
+        return items
+
+    async def answer_questions(self, items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Answer every item not yet in answers.jsonl, max_concurrency LLM calls at a time.
+
+        The pending questions are embedded as one query batch, as abatch_query does. Each answer
+        is appended as soon as it arrives, so a crash loses at most the questions in flight.
         """
-        Evaluate QA system using PDF documents.
-        
-        Args:
-            pdf_paths: List of PDF file paths
-            num_questions: Number of questions to generate
-            
+        path = self._checkpoint("answers.jsonl")
+        answers = {record["item_id"]: record for record in read_jsonl(path)}
+        todo = [item for item in items if item["item_id"] not in answers]
+        print(f"Answering {len(todo)} questions ({len(answers)} already answered)")
+        if not todo:
+            return [answers[item["item_id"]] for item in items]
+        embeddings = await self.qa_system.aembed_questions([item["question"] for item in todo])
+        semaphore = asyncio.Semaphore(self.eval_config.max_concurrency)
+
+        async def answer(item, embedding):
+            docs = await self.qa_system.asearch(embedding)
+            async with semaphore:
+                response = await self.qa_system.agenerate(item["question"], docs)
+            record = {
+                **item,
+                "answer": response.answer,
+                "contexts": [doc.content for doc in response.source_documents]
+            }
+            append_jsonl(path, [record])
+            answers[item["item_id"]] = record
+
+        results = await asyncio.gather(
+            *(answer(item, embedding) for item, embedding in zip(todo, embeddings)),
+            return_exceptions=True
+        )
+        for item, result in zip(todo, results):
+            if isinstance(result, Exception):
+                print(f"Error answering {item['question']!r}: {result}")
+        return [answers[item["item_id"]] for item in items if item["item_id"] in answers]
+
+    def _score_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        from datasets import Dataset
+        from ragas import evaluate
+
+        dataset = Dataset.from_list([
+            {
+                "question": record["question"],
+                "answer": record["answer"],
+                "contexts": record["contexts"],
+                "ground_truth": record["ground_truth"]
+            }
+            for record in batch
+        ])
+        scores = evaluate(dataset=dataset, metrics=self.get_metrics()).to_pandas()
+        return [
+            {"item_id": record["item_id"], **{name: float(row[name]) for name in METRIC_NAMES}}
+            for record, (_, row) in zip(batch, scores.iterrows())
+        ]
+
+    def score_answers(self, answers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score every answer not yet in scores.jsonl, in parallel batches"""
+        path = self._checkpoint("scores.jsonl")
+        scores = {record["item_id"]: record for record in read_jsonl(path)}
+        todo = [record for record in answers if record["item_id"] not in scores]
+        size = self.eval_config.metric_batch_size
+        batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+        print(f"Scoring {len(todo)} answers in {len(batches)} batches ({len(scores)} already scored)")
+
+        with ThreadPoolExecutor(max_workers=self.eval_config.metric_concurrency) as pool:
+            futures = {pool.submit(self._score_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"Error scoring {len(futures[future])} answers: {e}")
+                    continue
+                append_jsonl(path, rows)
+                scores.update((row["item_id"], row) for row in rows)
+        return [scores[record["item_id"]] for record in answers if record["item_id"] in scores]
+
+    def evaluate(self) -> Dict[str, Any]:
+        """Generate (or reload) questions, answer and score them, and write the combined results.
+
         Returns:
-            Dictionary containing evaluation scores and test questions used
+            Dictionary with the mean score per metric, the test questions and the per-item results
         """
-        all_documents = []
-        all_documents.extend(self.extract_text_from_pdf(self.document_path))
-
-        test_questions = self.dataset_generator.generate_questions_from_context(all_documents, self.eval_config.number_of_questions)
-        print(test_questions)
-        dataset = self.prepare_evaluation_dataset(test_questions)
-        print(dataset)
-        results = evaluate(
-            dataset=dataset,
-            metrics=list(self.metrics.values())
-        )
+        test_questions = self.load_or_generate_questions()
+        answers = asyncio.run(self.answer_questions(test_questions))
+        scores = {row["item_id"]: row for row in self.score_answers(answers)}
 
-        print("\n=== QA System Evaluation Summary ===")
-        print("\nMetrics Scores:")
-        df = results.to_pandas()
-        for f in df:
-            print(f)
+        df = pd.DataFrame([
+            {
+                "user_input": record["question"],
+                "retrieved_contexts": record["contexts"],
+                "response": record["answer"],
+                "reference": record["ground_truth"],
+                **{name: scores[record["item_id"]][name] for name in METRIC_NAMES}
+            }
+            for record in answers if record["item_id"] in scores
+        ])
         df.to_csv('eval_output.csv', index = False)
         df.to_json('output.json', orient='records', indent=2)
-            
-        print("\nScore interpretation guide:")
-        print("- Context Recall: Measures how well the system retrieves relevant context")
-        print("- Context Precision: Measures how precise the retrieved context is")
-        print("- Answer Relevancy: Measures how relevant the answer is to the question")
-        print("- Faithfulness: Measures how faithful the answer is to the provided context")
 
         return {
-            'metrics': results,
-            'test_questions': test_questions
+            'metrics': {name: float(df[name].mean()) for name in METRIC_NAMES} if len(df) else {},
+            'test_questions': test_questions,
+            'results': df
         }
 
-    def prepare_evaluation_dataset(self, test_questions: List[Dict[str, Any]]) -> Dataset:
-        """
-        Prepare dataset for Ragas evaluation.
-        
-        Args:
-            test_questions: List of dicts containing test questions and ground truth
-                          Format: [{'question': str, 'ground_truth': str}]
-        """
-        evaluated_data = []
-        
-        for item in test_questions:
-            question = item['question']
-            response = self.qa_system.query(question)
-            
-            evaluated_data.append({
-                'question': question,
-                'answer': response.answer,
-                'contexts': [doc.content for doc in response.source_documents],
-                'ground_truth': item['ground_truth']
-            })
-            
-        return Dataset.from_pandas(pd.DataFrame(evaluated_data))
-
-
-
     def print_summary(self, evaluation_results: Dict[str, Any]):
         """
         Print a formatted summary of evaluation results.
@@ -144,12 +232,12 @@ class QAEvaluator:
         print("\nMetrics Scores:")
         for metric, score in evaluation_results['metrics'].items():
             print(f"{metric:20}: {score:.3f}")
-            
+
         print("\nTest Questions Used:")
         for i, question in enumerate(evaluation_results['test_questions'], 1):
             print(f"\n{i}. Question: {question['question']}")
             print(f"   Ground Truth: {question['ground_truth']}")
-            
+
         print("\nScore interpretation guide:")
         print("- Context Recall: Measures how well the system retrieves relevant context")
         print("- Context Precision: Measures how precise the retrieved context is")
@@ -158,11 +246,22 @@ class QAEvaluator:
 
 
 class DatasetGenerator:
-    def __init__(self, llm):
+    """Generates question/ground truth pairs from document chunks, a few chunks per LLM call.
+
+    Chunks are sampled round-robin across pages so every page is used before any page
+    is used twice, batches are sent to the LLM concurrently, and questions repeated
+    across batches are dropped.
+    """
+
+    def __init__(self, llm, chunks_per_batch: int = 4, questions_per_batch: int = 5,
+                 max_concurrency: int = 8, seed: int = 0):
         self.llm = llm
-        self.question_generation_prompt = PromptTemplate(
-            input_variables=["context"],
-            template="""Given the following context, generate {number_of_questions} diverse questions that can be answered using this information. 
+        self.chunks_per_batch = chunks_per_batch
+        self.questions_per_batch = questions_per_batch
+        self.max_concurrency = max_concurrency
+        self.seed = seed
+        self.question_generation_prompt = PromptTemplate.from_template(
+            """Given the following context, generate {number_of_questions} diverse questions that can be answered using this information.
             For each question, also provide the ground truth answer based strictly on the given context.
             Format your response as a JSON array with objects containing 'question' and 'ground_truth' keys.
 
@@ -175,41 +274,150 @@ class DatasetGenerator:
                 {{"question": "How does Z work?", "ground_truth": "Z works by..."}}
             ]
             """)
-        
+
         self.question_chain = LLMChain(
             llm=self.llm,
             prompt=self.question_generation_prompt
         )
 
-    def generate_questions_from_context(self, context: str, number_of_questions: int) -> List[Dict[str, str]]:
-        """Generate questions and ground truth answers from a given context."""
+    def stratified_order(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        """Chunks shuffled within each page, then taken one page at a time in round-robin"""
+        rng = random.Random(self.seed)
+        by_page = {}
+        for chunk in chunks:
+            by_page.setdefault(chunk.metadata.get("page"), []).append(chunk)
+        pages = list(by_page.values())
+        for page in pages:
+            rng.shuffle(page)
+        rng.shuffle(pages)
+        longest = max((len(page) for page in pages), default=0)
+        return [page[i] for i in range(longest) for page in pages if i < len(page)]
+
+    @staticmethod
+    def parse_questions(text: str) -> List[Dict[str, str]]:
+        """Question/ground truth pairs in an LLM reply.
+
+        Code fences and surrounding prose are ignored; if the array as a whole is not
+        valid JSON, each {...} object in it is parsed on its own.
+        """
+        text = re.sub(r"```(?:json)?", "", text)
         try:
-            result = self.question_chain.invoke({"context": context, "number_of_questions": number_of_questions})
-            questions = json.loads(result['text'].replace('\n','').replace('json','').replace('```',''))
-            print(questions)
-            return questions
-        except json.JSONDecodeError:
+            parsed = json.loads(text[text.index("["):text.rindex("]") + 1])
+        except ValueError:
+            parsed = []
+            for match in re.findall(r"\{[^{}]*\}", text):
+                try:
+                    parsed.append(json.loads(match))
+                except json.JSONDecodeError:
+                    continue
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+        questions = []
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            question, ground_truth = item.get("question"), item.get("ground_truth")
+            if isinstance(question, str) and isinstance(ground_truth, str) and question.strip() and ground_truth.strip():
+                questions.append({"question": question.strip(), "ground_truth": ground_truth.strip()})
+        return questions
+
+    @staticmethod
+    def deduplicate(questions: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """First occurrence of each question, compared ignoring case and punctuation"""
+        seen, unique = set(), []
+        for item in questions:
+            key = " ".join(re.findall(r"\w+", item["question"].lower()))
+            if key not in seen:
+                seen.add(key)
+                unique.append(item)
+        return unique
+
+    async def _generate_batch(self, semaphore: asyncio.Semaphore, batch: List[DocumentChunk]) -> List[Dict[str, Any]]:
+        context = "\n\n".join(chunk.content for chunk in batch)
+        async with semaphore:
+            try:
+                result = await self.question_chain.ainvoke(
+                    {"context": context, "number_of_questions": self.questions_per_batch}
+                )
+            except Exception as e:
+                print(f"Error generating questions: {str(e)}")
+                return []
+        questions = self.parse_questions(result["text"])
+        if not questions:
             print("Error: Failed to parse LLM output as JSON")
+        pages = sorted({chunk.metadata.get("page") for chunk in batch}, key=str)
+        return [{**question, "pages": pages} for question in questions]
+
+    async def agenerate_questions(self, chunks: List[DocumentChunk], number_of_questions: int,
+                                  max_rounds: int = 3) -> List[Dict[str, Any]]:
+        """Generate number_of_questions unique questions from chunks.
+
+        Each round sends enough batches to cover what is still missing; later rounds
+        continue through the stratified order, so a shortfall from duplicates or
+        unparseable replies is filled from chunks not used yet where possible.
+        """
+        order = self.stratified_order(chunks)
+        if not order:
             return []
-        except Exception as e:
-            print(f"Error generating questions: {str(e)}")
-            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        questions, position = [], 0
+        for _ in range(max_rounds):
+            missing = number_of_questions - len(questions)
+            if missing <= 0:
+                break
+            batches = []
+            for _ in range(math.ceil(missing / self.questions_per_batch)):
+                # wrap around when the document has fewer chunks than the batches need
+                batches.append([order[(position + i) % len(order)] for i in range(min(self.chunks_per_batch, len(order)))])
+                position += self.chunks_per_batch
+            print(f"Generating questions from {len(batches)} batches of chunks")
+            results = await asyncio.gather(*(self._generate_batch(semaphore, batch) for batch in batches))
+            questions = self.deduplicate(questions + [question for result in results for question in result])
+        return questions[:number_of_questions]
+
+    def generate_questions(self, chunks: List[DocumentChunk], number_of_questions: int) -> List[Dict[str, Any]]:
+        return asyncio.run(self.agenerate_questions(chunks, number_of_questions))
+
+
+def main():
+    load_dotenv()
+    defaults = EvalConfig()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "source_data.pdf"))
+    parser.add_argument("--questions", type=int, default=defaults.number_of_questions)
+    parser.add_argument("--questions-per-batch", type=int, default=defaults.questions_per_batch)
+    parser.add_argument("--chunks-per-batch", type=int, default=defaults.chunks_per_batch)
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency)
+    parser.add_argument("--metric-batch-size", type=int, default=defaults.metric_batch_size)
+    parser.add_argument("--metric-concurrency", type=int, default=defaults.metric_concurrency)
+    parser.add_argument("--run-dir", default=defaults.run_directory, help="checkpoints; reuse it to resume a run")
+    args = parser.parse_args()
 
+    from langchain_openai import ChatOpenAI
 
-config = QAConfig(
-    vector_store_type="chroma",
-    llm_type="openai",
-    llm_config={"openai_api_key": os.getenv("OPENAI_API_KEY"), "temperature": 0.8, "model": "gpt-4o-mini"},
-    embeddings_type="openai",
-    embeddings_config={"openai_api_key": os.getenv("OPENAI_API_KEY")})
-qa_system = QASystem(config)
-qa_system.initialize(file_path="/Users/rsaraf/Documents/agoge-main/agoge/demos/qp/source_data.pdf")
-llm = ChatOpenAI(temperature=0.8, model="gpt-4o")
+    config = QAConfig(
+        vector_store_type="chroma",
+        llm_type="openai",
+        llm_config={"openai_api_key": os.getenv("OPENAI_API_KEY"), "temperature": 0.8, "model": "gpt-4o-mini"},
+        embeddings_type="openai",
+        embeddings_config={"openai_api_key": os.getenv("OPENAI_API_KEY")},
+        extraction_cache_path="_extraction_cache")
+    qa_system = QASystem(config)
+    qa_system.initialize(file_path=args.pdf)
+    llm = ChatOpenAI(temperature=0.8, model="gpt-4o")
 
+    eval_config = EvalConfig(
+        number_of_questions=args.questions,
+        questions_per_batch=args.questions_per_batch,
+        chunks_per_batch=args.chunks_per_batch,
+        max_concurrency=args.max_concurrency,
+        metric_batch_size=args.metric_batch_size,
+        metric_concurrency=args.metric_concurrency,
+        run_directory=args.run_dir
+    )
+    evaluator = QAEvaluator(qa_system, llm, args.pdf, eval_config)
+    evaluator.print_summary(evaluator.evaluate())
 
-evaluator = QAEvaluator(qa_system, llm)
-paths = []
-paths.append(os.path.join(os.getcwd(), "source_data.pdf"))
-results = evaluator.evaluate(paths, num_questions=5)
-print(results)
 
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,576 @@
+import asyncio
+import hashlib
 import tempfile
+import threading
+import time
 import os
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
 
 import shutil
 
 from models import *
 from fastapi import HTTPException, status
 from qa_system import QASystem
+from config import QAResponse
+from jobs import IngestionQueue, IngestionQueueFull, READY, FAILED
+from cache import SemanticAnswerCache
+from registry import DocumentRegistry, PROCESSING
+from stores import VectorStoreFactory, VectorStoreLoadError
+from metrics import CACHE_LOOKUPS, collect_timings
+from extraction import PageTextCache, file_hash
 
 current_directory = os.path.dirname(os.path.abspath(__file__))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class StagedUpload(NamedTuple):
+    """An upload copied into the uploads directory, hashed and sized while it was copied"""
+    path: str
+    content_hash: str
+    size: int
+
 class QAService:
-    def __init__(self):
-        self.documents: Dict[str, DocumentMetadata] = {}
-        self.qa_systems: Dict[str, QASystem] = {}
-        self.base_vector_store_path = "vector_stores"
-        self.file_uploads_directory = os.path.join(current_directory, "_api_file_uploads")
+    def __init__(
+        self,
+        max_ingestion_workers: int = 2,
+        max_pending_ingestions: int = 32,
+        answer_cache_threshold: float = 0.95,
+        answer_cache_ttl: float = 3600,
+        answer_cache_max_entries: int = 256,
+        vector_store_mode: str = "per_document",
+        max_loaded_systems: int = 32,
+        idle_seconds: float = 1800,
+        preload: Optional[List[str]] = None,
+        max_llm_concurrency: int = 8,
+        vector_store_type: str = "chroma",
+        llm_type: str = "openai",
+        embeddings_type: str = "openai",
+        data_directory: Optional[str] = None,
+        max_upload_bytes: int = 100 * 1024 * 1024
+    ):
+        self.ingestion = IngestionQueue(max_ingestion_workers, max_pending_ingestions)
+        self.answer_cache = SemanticAnswerCache(answer_cache_threshold, answer_cache_ttl, answer_cache_max_entries)
+        self.max_llm_concurrency = max_llm_concurrency
+        self.vector_store_type = vector_store_type
+        self.llm_type = llm_type
+        self.embeddings_type = embeddings_type
+        self.max_upload_bytes = max_upload_bytes
+        # uploads and the embeddings and extraction caches default to the source directory, stores to the working directory
+        self.base_vector_store_path = os.path.join(data_directory, "vector_stores") if data_directory else "vector_stores"
+        self.file_uploads_directory = os.path.join(data_directory or current_directory, "_api_file_uploads")
+        self.embeddings_cache_path = os.path.join(data_directory or current_directory, "_embeddings_cache.sqlite3")
+        self.extraction_cache_path = os.path.join(data_directory or current_directory, "_extraction_cache")
+        self.page_cache = PageTextCache(self.extraction_cache_path)
         os.makedirs(self.file_uploads_directory, exist_ok=True)
+        os.makedirs(self.base_vector_store_path, exist_ok=True)
+
+        self.registry = DocumentRegistry(os.path.join(self.base_vector_store_path, "registry.sqlite3"))
+        self.documents: Dict[str, DocumentMetadata] = self.registry.load_documents()
+        # indexes are keyed by content hash; every document_id with the same content shares one.
+        # Only recently used ones stay open: opened on the first question, evicted LRU or when idle.
+        self.qa_systems: "OrderedDict[str, QASystem]" = OrderedDict()
+        self.max_loaded_systems = max_loaded_systems
+        self.idle_seconds = idle_seconds
+        self._last_used: Dict[str, float] = {}
+        self._systems_lock = threading.Lock()
+        # indexes being opened, so concurrent first questions share one load
+        self._loading: Dict[str, asyncio.Future] = {}
 
-    def _get_vector_store_path(self, document_id: str) -> str:
-        return os.path.join(self.base_vector_store_path, document_id)
+        if vector_store_mode not in ("per_document", "shared"):
+            raise ValueError(f"Unsupported vector store mode: {vector_store_mode}")
+        # in shared mode one store, LLM and embeddings client serve every document
+        self.shared_system: Optional[QASystem] = None
+        if vector_store_mode == "shared":
+            self.shared_system = QASystem(self._system_config(self._get_shared_store_path()))
 
-    async def process_document(self, file_content: bytes, filename: str) -> DocumentMetadata:
-        metadata = DocumentMetadata(filename=filename)
-    
-        file_path = os.path.join(self.file_uploads_directory, filename)
-        print(file_path)
+        # ingestion interrupted by a restart resumes: pages already in the index are kept
+        for content_hash in self.registry.list_indexes(PROCESSING):
+            if os.path.exists(self._get_upload_path(content_hash)):
+                try:
+                    self._submit_ingestion(content_hash, incremental=True)
+                except IngestionQueueFull:
+                    # reported like any failed ingestion; uploading the file again re-indexes it
+                    self.registry.set_index_status(content_hash, FAILED, "Ingestion queue full after restart")
+            else:
+                self.registry.set_index_status(content_hash, FAILED, "Upload missing after restart")
 
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
+        for document_id in preload or []:
+            metadata = self.documents.get(document_id)
+            if metadata is not None and self._index_stage(metadata.content_hash) == READY:
+                self._load_qa_system(metadata.content_hash)
 
-        system_config = QAConfig(
-            vector_store_type="chroma",
-            llm_type="openai",
-            llm_config={"openai_api_key": os.getenv("OPENAI_API_KEY"), "temperature": 0.8, "model": "gpt-4o-mini"},
-            embeddings_type="openai",
-            embeddings_config={"openai_api_key": os.getenv("OPENAI_API_KEY")}
+    def _system_config(self, vector_store_path: str) -> QAConfig:
+        openai = {"openai_api_key": os.getenv("OPENAI_API_KEY")}
+        return QAConfig(
+            vector_store_type=self.vector_store_type,
+            llm_type=self.llm_type,
+            llm_config={**openai, "temperature": 0.8, "model": "gpt-4o-mini"} if self.llm_type == "openai" else {},
+            embeddings_type=self.embeddings_type,
+            embeddings_config=openai if self.embeddings_type == "openai" else {},
+            embeddings_cache_path=self.embeddings_cache_path,
+            extraction_cache_path=self.extraction_cache_path,
+            ingest_streaming=True,
+            vector_store_path=vector_store_path
         )
 
-        qa_system = QASystem(system_config)
-        qa_system.initialize(file_path)
-        
-        self.documents[metadata.document_id] = metadata
-        self.qa_systems[metadata.document_id] = qa_system
-        
+    def _create_qa_system(self, content_hash: str) -> QASystem:
+        if self.shared_system is not None:
+            return self.shared_system.for_document(content_hash)
+        return QASystem(self._system_config(self._get_vector_store_path(content_hash)))
+
+    def _get_vector_store_path(self, content_hash: str) -> str:
+        if self.shared_system is not None:
+            return self._get_shared_store_path()
+        return os.path.join(self.base_vector_store_path, content_hash)
+
+    def _get_shared_store_path(self) -> str:
+        return os.path.join(self.base_vector_store_path, "shared")
+
+    def _get_upload_path(self, content_hash: str) -> str:
+        return os.path.join(self.file_uploads_directory, f"{content_hash}.pdf")
+
+    def _copy_upload(self, file_obj: BinaryIO) -> StagedUpload:
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self.file_uploads_directory, suffix=".part", delete=False) as tmp:
+            try:
+                while True:
+                    block = file_obj.read(COPY_CHUNK_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > self.max_upload_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Upload is larger than {self.max_upload_bytes} bytes"
+                        )
+                    sha256.update(block)
+                    tmp.write(block)
+            except BaseException:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+        return StagedUpload(tmp.name, sha256.hexdigest(), size)
+
+    async def stage_upload(self, file_obj: BinaryIO) -> StagedUpload:
+        """Copy an upload into the uploads directory in COPY_CHUNK_SIZE blocks, on a worker thread.
+
+        Raises 413 as soon as more than max_upload_bytes have been read. The caller
+        passes the staged path to process_document or update_document.
+        """
+        return await asyncio.to_thread(self._copy_upload, file_obj)
+
+    def _store_upload(self, file_path: str, content_hash: Optional[str]) -> str:
+        """Move a file to its content address (dropping it if that content is stored already)"""
+        if content_hash is None:
+            content_hash = file_hash(file_path)
+        upload_path = self._get_upload_path(content_hash)
+        if os.path.exists(upload_path):
+            os.remove(file_path)
+        else:
+            shutil.move(file_path, upload_path)
+        return content_hash
+
+    def _index_stage(self, content_hash: str) -> Optional[str]:
+        if content_hash in self.qa_systems:
+            return READY
+        job = self.ingestion.get(content_hash)
+        if job is not None:
+            return job.stage
+        index = self.registry.get_index(content_hash)
+        return index["status"] if index else None
+
+    def _is_indexed(self, content_hash: str) -> bool:
+        """True if the content is indexed or being indexed, so new uploads can alias it"""
+        return self._index_stage(content_hash) not in (None, FAILED)
+
+    def _submit_ingestion(self, content_hash: str, incremental: bool = False):
+        """Index the upload in the background; incremental only embeds pages missing from the index"""
+        file_path = self._get_upload_path(content_hash)
+
+        def ingest(job):
+            try:
+                if not incremental:
+                    # the stores take any data under the path for a finished index, so start clean
+                    self._clear_index(content_hash)
+                qa_system = self._create_qa_system(content_hash)
+                if incremental:
+                    qa_system.update(file_path, on_progress=job.update)
+                else:
+                    qa_system.initialize(file_path, on_progress=job.update)
+            except Exception as e:
+                self.registry.set_index_status(content_hash, FAILED, str(e))
+                raise
+            self.registry.set_index_status(content_hash, READY)
+            if self._references(content_hash):
+                # it was just built, so keep it open for the first questions
+                self._cache_qa_system(content_hash, qa_system)
+
+        self.ingestion.submit(content_hash, ingest)
+
+    def _cache_qa_system(self, content_hash: str, qa_system: QASystem):
+        with self._systems_lock:
+            self.qa_systems[content_hash] = qa_system
+            self.qa_systems.move_to_end(content_hash)
+            self._last_used[content_hash] = time.monotonic()
+            self._evict()
+
+    def _evict(self):
+        """Drop systems idle for longer than idle_seconds, then the least recently used over budget"""
+        now = time.monotonic()
+        for content_hash in [h for h, used in self._last_used.items() if now - used > self.idle_seconds]:
+            self.qa_systems.pop(content_hash, None)
+            del self._last_used[content_hash]
+        while len(self.qa_systems) > self.max_loaded_systems:
+            content_hash, _ = self.qa_systems.popitem(last=False)
+            del self._last_used[content_hash]
+
+    def _cached_qa_system(self, content_hash: str) -> Optional[QASystem]:
+        with self._systems_lock:
+            qa_system = self.qa_systems.get(content_hash)
+            if qa_system is not None:
+                self.qa_systems.move_to_end(content_hash)
+                self._last_used[content_hash] = time.monotonic()
+            return qa_system
+
+    def _load_qa_system(self, content_hash: str) -> QASystem:
+        qa_system = self._cached_qa_system(content_hash)
+        if qa_system is not None:
+            return qa_system
+
+        print(f"Opening index {content_hash}")
+        qa_system = self._create_qa_system(content_hash)
+        try:
+            qa_system.initialize()
+        except VectorStoreLoadError as e:
+            # a corrupt index is reported, not silently rebuilt; uploading the file again reindexes it
+            self.registry.set_index_status(content_hash, FAILED, str(e))
+            raise HTTPException(status_code=500, detail=str(e))
+        self._cache_qa_system(content_hash, qa_system)
+        return qa_system
+
+    async def process_document(self, file_path: str, filename: str, content_hash: Optional[str] = None) -> DocumentMetadata:
+        """Take over the PDF at file_path and queue it for ingestion; returns before the document is indexed.
+
+        The file is moved into the uploads directory. Pass content_hash when it is
+        already known (see stage_upload) to skip hashing the file again. Content that
+        is already indexed is not processed again: the new document_id becomes an alias
+        of the existing index.
+        """
+        content_hash = await asyncio.to_thread(self._store_upload, file_path, content_hash)
+        metadata = DocumentMetadata(filename=filename, content_hash=content_hash)
+
+        if self._is_indexed(content_hash):
+            print(f"{filename} is already indexed as {content_hash}")
+            self._add_document(metadata)
+            return metadata
+
+        self.registry.add_index(content_hash, self._get_vector_store_path(content_hash))
+        self._add_document(metadata)
+        try:
+            self._submit_ingestion(content_hash)
+        except IngestionQueueFull as e:
+            del self.documents[metadata.document_id]
+            self.registry.delete_document(metadata.document_id)
+            self.registry.delete_index(content_hash)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e)
+            )
+
         return metadata
 
+    async def update_document(
+        self, document_id: str, file_path: str, filename: str, content_hash: Optional[str] = None
+    ) -> DocumentMetadata:
+        """Replace a document's content with the PDF at file_path; returns before it is re-indexed.
 
-    async def get_answer(self, question: str, document_id: str) -> QuestionResponse:
-        if document_id not in self.qa_systems:
+        The new index starts as a copy of the current one and only pages whose text
+        changed are re-embedded (see QASystem.update). In shared mode, or when the current
+        index failed, the new content is indexed from scratch. Raises 409 while the current
+        index is still being built.
+        """
+        old = self.documents.get(document_id)
+        if old is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Document with ID {document_id} not found"
             )
+        if self._index_stage(old.content_hash) not in (READY, FAILED, None):
+            # the old index is removed below once nothing references it, which must not
+            # happen while its ingestion is still writing
+            self._raise_not_ready(document_id)
+        content_hash = await asyncio.to_thread(self._store_upload, file_path, content_hash)
+        if content_hash == old.content_hash:
+            print(f"{filename} is unchanged")
+            return old
+        metadata = DocumentMetadata(document_id=document_id, filename=filename, content_hash=content_hash)
+
+        if not self._is_indexed(content_hash):
+            vector_store_path = self._get_vector_store_path(content_hash)
+            incremental = self.shared_system is None and self._index_stage(old.content_hash) == READY
+            self.registry.add_index(content_hash, vector_store_path)
+            try:
+                if incremental:
+                    # copied from disk, so no open system may hold the old index while it is read
+                    with self._systems_lock:
+                        self.qa_systems.pop(old.content_hash, None)
+                        self._last_used.pop(old.content_hash, None)
+                    old_path = self._get_vector_store_path(old.content_hash)
+                    await asyncio.to_thread(shutil.copytree, old_path, vector_store_path, dirs_exist_ok=True)
+                self._submit_ingestion(content_hash, incremental=incremental)
+            except IngestionQueueFull as e:
+                self.registry.delete_index(content_hash)
+                shutil.rmtree(vector_store_path, ignore_errors=True)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=str(e)
+                )
+
+        self.answer_cache.invalidate(document_id)
+        self._add_document(metadata)
+        if not self._references(old.content_hash):
+            self._remove_index(old.content_hash)
+        return metadata
+
+    def _add_document(self, metadata: DocumentMetadata):
+        self.documents[metadata.document_id] = metadata
+        self.registry.add_document(metadata)
+
+    def _references(self, content_hash: str) -> int:
+        return sum(1 for doc in self.documents.values() if doc.content_hash == content_hash)
+
+    def get_status(self, document_id: str) -> DocumentStatusResponse:
+        if document_id not in self.documents:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document with ID {document_id} not found"
+            )
+        content_hash = self.documents[document_id].content_hash
+        job = self.ingestion.get(content_hash)
+        if job is not None:
+            stage, error = job.stage, job.error
+        else:
+            index = self.registry.get_index(content_hash) or {"status": FAILED, "error": "Index missing"}
+            stage, error = index["status"], index["error"]
+        return DocumentStatusResponse(
+            document_id=document_id,
+            filename=self.documents[document_id].filename,
+            stage=stage,
+            chunks_embedded=job.chunks_embedded if job else 0,
+            total_chunks=job.total_chunks if job else None,
+            error=error
+        )
+
+
+    async def get_qa_system(self, document_id: str) -> QASystem:
+        """Return the document's QASystem, or raise 404/409 if it is unknown or not ready yet.
+
+        An index that is not open is opened on a worker thread; concurrent first questions
+        for the same index wait on one load.
+        """
+        metadata = self.documents.get(document_id)
+        if metadata is None or self._index_stage(metadata.content_hash) != READY:
+            self._raise_not_ready(document_id)
+        content_hash = metadata.content_hash
+        qa_system = self._cached_qa_system(content_hash)
+        if qa_system is not None:
+            return qa_system
+
+        loading = self._loading.get(content_hash)
+        if loading is None:
+            loading = asyncio.ensure_future(asyncio.to_thread(self._load_qa_system, content_hash))
+            self._loading[content_hash] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(content_hash, None))
+        # shielded: one caller going away must not cancel the load for the others
+        return await asyncio.shield(loading)
+
+    def _lookup_answer(self, document_id: str, embedding: List[float]) -> Optional[QAResponse]:
+        response = self.answer_cache.lookup(document_id, embedding)
+        CACHE_LOOKUPS.inc(cache="answer", result="miss" if response is None else "hit")
+        return response
+
+    async def get_answer(self, question: str, document_id: str, include_timings: bool = False) -> QuestionResponse:
+        """Answer one question; include_timings adds the seconds spent per stage to the metadata"""
+        qa_system = await self.get_qa_system(document_id)
         print(f"Question: {question}")
-        qa_system = self.qa_systems[document_id]
-        
-        response = qa_system.query(question)
-        
+
+        with collect_timings() as timings:
+            embedding = await qa_system.aembed_question(question)
+            response = self._lookup_answer(document_id, embedding)
+            cache_hit = response is not None
+            coalesced = False
+            if not cache_hit:
+                async def answer():
+                    result = await qa_system.aquery(question, embedding)
+                    self.answer_cache.store(document_id, question, embedding, result)
+                    return result
+
+                key = (document_id, self.answer_cache.normalize_question(question))
+                response, coalesced = await self.answer_cache.single_flight(key, answer)
+
+        extra = {"timings": timings} if include_timings else {}
+        return self._question_response(response, document_id, cache_hit=cache_hit, coalesced=coalesced, **extra)
+
+    def _question_response(self, response: QAResponse, document_id: str, **extra_metadata) -> QuestionResponse:
         return QuestionResponse(
             answer=response.answer,
-            source_documents=[
-                SourceDocument(content=doc.content, metadata=doc.metadata)
-                for doc in response.source_documents
-            ],
+            source_documents=self._source_documents(response.source_documents),
             metadata={
                 "document_id": document_id,
-                "filename": self.documents[document_id].filename
+                "filename": self.documents[document_id].filename,
+                **{key: value for key, value in response.metadata.items() if key.startswith("prompt_tokens")},
+                **extra_metadata
             }
         )
 
+    async def get_answers(self, items: List[QuestionRequest], max_concurrency: Optional[int] = None) -> List[BatchQuestionResult]:
+        """Answer a batch of questions, in order, with a status per item.
+
+        All questions are embedded as one query batch, searches run together and at most
+        max_concurrency LLM calls are in flight (capped by max_llm_concurrency).
+        """
+        results: List[Optional[BatchQuestionResult]] = [None] * len(items)
+
+        def fail(i, status_code, error):
+            results[i] = BatchQuestionResult(
+                document_id=items[i].document_id, question=items[i].question,
+                status="error", status_code=status_code, error=error
+            )
+
+        systems: Dict[str, QASystem] = {}
+        pending = []
+        for i, item in enumerate(items):
+            try:
+                if item.document_id not in systems:
+                    systems[item.document_id] = await self.get_qa_system(item.document_id)
+                pending.append(i)
+            except HTTPException as e:
+                fail(i, e.status_code, e.detail)
+        if not pending:
+            return results
+
+        # every QASystem is built from the same embeddings config, so any of them can embed the whole batch
+        vectors = await systems[items[pending[0]].document_id].aembed_questions([items[i].question for i in pending])
+
+        misses: Dict[str, List[int]] = {}
+        for i, embedding in zip(pending, vectors):
+            cached = self._lookup_answer(items[i].document_id, embedding)
+            if cached is not None:
+                results[i] = BatchQuestionResult(
+                    document_id=items[i].document_id, question=items[i].question, status="ok",
+                    response=self._question_response(cached, items[i].document_id, cache_hit=True)
+                )
+            else:
+                misses.setdefault(items[i].document_id, []).append(i)
+
+        vector_of = dict(zip(pending, vectors))
+        semaphore = asyncio.Semaphore(min(max_concurrency or self.max_llm_concurrency, self.max_llm_concurrency))
+
+        async def answer_document(document_id, indexes):
+            responses = await systems[document_id].abatch_query(
+                [items[i].question for i in indexes],
+                embeddings=[vector_of[i] for i in indexes],
+                semaphore=semaphore
+            )
+            for i, response in zip(indexes, responses):
+                if isinstance(response, Exception):
+                    fail(i, status.HTTP_500_INTERNAL_SERVER_ERROR, str(response))
+                    continue
+                self.answer_cache.store(document_id, items[i].question, vector_of[i], response)
+                results[i] = BatchQuestionResult(
+                    document_id=document_id, question=items[i].question, status="ok",
+                    response=self._question_response(response, document_id, cache_hit=False)
+                )
+
+        await asyncio.gather(*(answer_document(document_id, indexes) for document_id, indexes in misses.items()))
+        return results
+
+    async def stream_answer(self, question: str, document_id: str):
+        """Yield (event, data) pairs: "sources" first, then "token"s, then "done" with the metadata.
+
+        Call get_qa_system first so unknown or unready documents fail before streaming starts.
+        """
+        qa_system = await self.get_qa_system(document_id)
+        metadata = self.documents[document_id]
+        print(f"Question (streaming): {question}")
+        response_metadata = {"document_id": document_id, "filename": metadata.filename}
+
+        embedding = await qa_system.aembed_question(question)
+        cached = self._lookup_answer(document_id, embedding)
+        if cached is not None:
+            yield "sources", self._source_documents(cached.source_documents)
+            yield "token", cached.answer
+            yield "done", {**response_metadata, "cache_hit": True}
+            return
+
+        sources = []
+        tokens = []
+        async for event, data in qa_system.astream(question, embedding):
+            if event == "sources":
+                sources = data
+                yield "sources", self._source_documents(data)
+            else:
+                tokens.append(data)
+                yield "token", data
+
+        self.answer_cache.store(
+            document_id, question, embedding,
+            QAResponse(answer="".join(tokens), source_documents=sources, metadata={"query": question})
+        )
+        yield "done", {**response_metadata, "cache_hit": False}
+
+    @staticmethod
+    def _source_documents(documents) -> List[SourceDocument]:
+        return [SourceDocument(content=doc.content, metadata=doc.metadata) for doc in documents]
+
+    def _raise_not_ready(self, document_id: str):
+        doc_status = self.get_status(document_id)
+        if doc_status.stage == FAILED:
+            detail = f"Document with ID {document_id} failed to process: {doc_status.error}"
+        else:
+            total = "?" if doc_status.total_chunks is None else doc_status.total_chunks
+            detail = (
+                f"Document with ID {document_id} is still being processed "
+                f"(stage: {doc_status.stage}, {doc_status.chunks_embedded}/{total} chunks embedded)"
+            )
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
     def cleanup_document(self, document_id: str):
-        """Remove document and its associated resources"""
+        """Remove document and its associated resources; raises 409 while its index is being built"""
         if document_id in self.documents:
-            # Remove vector store
-            vector_store_path = self._get_vector_store_path(document_id)
-            if os.path.exists(vector_store_path):
-                shutil.rmtree(vector_store_path)
-            
-            # Remove from dictionaries
-            del self.documents[document_id]
-            del self.qa_systems[document_id]
+            if self._index_stage(self.documents[document_id].content_hash) not in (READY, FAILED, None):
+                # the running ingestion would keep writing to the store removed here
+                self._raise_not_ready(document_id)
+            self.answer_cache.invalidate(document_id)
+            content_hash = self.documents.pop(document_id).content_hash
+            self.registry.delete_document(document_id)
+            if self._references(content_hash):
+                # other documents are aliases of the same index
+                return
+            self._remove_index(content_hash)
+
+    def _clear_index(self, content_hash: str):
+        """Delete an index's vectors: its store directory, or its chunks in the shared store"""
+        if self.shared_system is not None:
+            vector_store = self.shared_system.vector_store
+            if vector_store.store is None:
+                vector_store.load_existing()
+            vector_store.delete_document(content_hash)
+        else:
+            config = self._system_config(self._get_vector_store_path(content_hash))
+            VectorStoreFactory.create_vector_store(config, None).destroy()
+
+    def _remove_index(self, content_hash: str):
+        """Remove an index no document references any more, with its upload and extracted page text"""
+        self._clear_index(content_hash)
+        upload_path = self._get_upload_path(content_hash)
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+        self.page_cache.remove(content_hash)
+
+        with self._systems_lock:
+            self.qa_systems.pop(content_hash, None)
+            self._last_used.pop(content_hash, None)
+        self.ingestion.remove(content_hash)
+        self.registry.delete_index(content_hash)
@@ -0,0 +1,57 @@
+import bisect
+from typing import List, Tuple
+
+from context import token_offsets
+
+# chunk ends looked for in the last quarter of a window, best first
+_BREAKS = (("\n\n",), ("\n",), (". ", "? ", "! "))
+
+
+class TokenChunker:
+    """Splits text into chunks of at most chunk_tokens tokens in one pass over its tokens.
+
+    The text is tokenized once (context.token_offsets). Each chunk ends at the best
+    break in the last quarter of its window: a paragraph break, then a line break, then
+    the end of a sentence, else the window's last token. The next chunk starts
+    chunk_overlap tokens before that end.
+    """
+
+    def __init__(self, chunk_tokens: int, chunk_overlap: int):
+        if not 0 <= chunk_overlap < chunk_tokens:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_tokens ({chunk_tokens})")
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+
+    @staticmethod
+    def _break(text: str, starts: List[int], earliest: int, last: int) -> int:
+        """Index of the token after the best break between tokens earliest and last, else last"""
+        # a break character at position p ends the chunk before the first token starting after p
+        lo, hi = starts[earliest] - 1, starts[last]
+        for separators in _BREAKS:
+            position = max(text.rfind(separator, lo, hi) for separator in separators)
+            if position >= 0:
+                return min(max(bisect.bisect_left(starts, position + 1), earliest), last)
+        return last
+
+    def spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, tokens) of each chunk; start and end are character offsets into text"""
+        starts = token_offsets(text)
+        count = len(starts)
+        spans = []
+        first = 0
+        while first < count:
+            last = min(first + self.chunk_tokens, count)
+            if last < count:
+                last = self._break(text, starts, first + max(1, self.chunk_tokens * 3 // 4), last)
+
+            start, end = starts[first], starts[last] if last < count else len(text)
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start < end:
+                spans.append((start, end, last - first))
+            if last == count:
+                break
+            first = max(last - self.chunk_overlap, first + 1)
+        return spans
@@ -1,73 +1,639 @@
+import asyncio
+import itertools
+import json
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_chroma.vectorstores import Chroma
+import shutil
+import threading
+import uuid
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+from metrics import timed
+
+def _batches(chunks, batch_size):
+    """Consume chunks (a list or a generator) in fixed-size batches"""
+    chunks = iter(chunks)
+    done = 0
+    while True:
+        batch = list(itertools.islice(chunks, batch_size))
+        if not batch:
+            return
+        done += len(batch)
+        yield [chunk.content for chunk in batch], [chunk.metadata for chunk in batch], done
+
+def _faiss():
+    """The faiss module, imported on first use so deployments on other stores never load it"""
+    import faiss
+    return faiss
+
+def _langchain_faiss():
+    """LangChain's FAISS vector store class, imported on first use like _faiss"""
+    from langchain_community.vectorstores import FAISS
+    return FAISS
+
+def _total(chunks):
+    return len(chunks) if hasattr(chunks, "__len__") else None
 
 class BaseVectorStore:
     def __init__(self, config, embeddings):
         self.config = config
         self.embeddings = embeddings
         self.store = None
+        # a store may be shared by every document (multi-tenant mode) and written from several ingestion threads
+        self._write_lock = threading.Lock()
 
     def load_existing(self) -> bool:
         raise NotImplementedError
 
-    def store_documents(self, chunks):
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        with timed("embed", self.config.embeddings_type):
+            return self.embeddings.embed_documents(texts)
+
+    def _inserting(self):
+        return timed("vector_insert", self.config.vector_store_type)
+
+    def store_documents(self, chunks, on_progress=None):
+        """Embed and insert chunks in batches of config.ingest_batch_size.
+
+        chunks may be a generator, in which case total_chunks is None.
+        on_progress(chunks_embedded, total_chunks) is called after every batch.
+        """
         raise NotImplementedError
 
     def get_retriever(self, **kwargs):
         raise NotImplementedError
 
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None):
+        return self.store.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+    async def asimilarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None):
+        return await self.store.asimilarity_search_by_vector(embedding, k=k, filter=filter)
+
+    def has_document(self, document_id: str) -> bool:
+        """True if any chunk carries this document_id in its metadata"""
+        raise NotImplementedError
+
+    def delete_document(self, document_id: str):
+        """Remove every chunk of one document in place"""
+        raise NotImplementedError
+
+    @staticmethod
+    def chunk_id(metadata: dict) -> str:
+        """Store id of a chunk: its chunk_key, scoped by document_id in shared stores (random without a key)"""
+        key = metadata.get("chunk_key")
+        if key is None:
+            return str(uuid.uuid4())
+        document_id = metadata.get("document_id")
+        return f"{document_id}:{key}" if document_id is not None else key
+
+    def chunk_metadata(self, document_id: str = None) -> Dict[str, dict]:
+        """Store id -> metadata of every stored chunk, or of one document's chunks"""
+        raise NotImplementedError
+
+    def upsert_documents(self, chunks, on_progress=None):
+        """Store chunks, replacing any stored chunk with the same id"""
+        chunks = list(chunks)
+        if not chunks:
+            return
+        self.delete([self.chunk_id(chunk.metadata) for chunk in chunks])
+        self.store_documents(chunks, on_progress)
+
+    def delete(self, ids: List[str]):
+        """Remove chunks by store id; ids that are not stored are ignored"""
+        raise NotImplementedError
+
+    def destroy(self):
+        """Delete the whole index at vector_store_path"""
+        with self._write_lock:
+            self.store = None
+            shutil.rmtree(self.config.vector_store_path, ignore_errors=True)
+
+class VectorStoreLoadError(RuntimeError):
+    """A persisted index exists but could not be opened (as opposed to no index at all)"""
+
 class FAISSVectorStore(BaseVectorStore):
+    """FAISS index chosen by config.faiss_index_type: flat, hnsw, ivf_flat or ivf_pq.
+
+    IVF indexes are trained once on the first config.faiss_train_size chunks; the
+    trained centroids are saved with the index, so later chunks are only added.
+    """
+
+    _TRAINED_TYPES = ("ivf_flat", "ivf_pq")
+
     def load_existing(self) -> bool:
+        path = self.config.vector_store_path
+        if not os.path.exists(os.path.join(path, "index.faiss")):
+            return False
         try:
-            self.store = FAISS.load_local(
-                self.config.vector_store_path,
+            self.store = _langchain_faiss().load_local(
+                path,
                 self.embeddings,
-                index_name="index"
+                index_name="index",
+                allow_dangerous_deserialization=True
             )
-            return True
-        except:
-            return False
+        except Exception as e:
+            raise VectorStoreLoadError(f"Could not load FAISS index from {path}: {e}") from e
+        self._tune()
+        return True
+
+    def _new_index(self, sample: np.ndarray):
+        d = sample.shape[1]
+        index_type = self.config.faiss_index_type
+        if index_type == "flat":
+            return _faiss().IndexFlatL2(d)
+        if index_type == "hnsw":
+            return _faiss().IndexHNSWFlat(d, self.config.faiss_hnsw_m)
+        if index_type not in self._TRAINED_TYPES:
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
+
+        # faiss wants ~39 training points per centroid
+        nlist = min(self.config.faiss_nlist, max(1, len(sample) // 39))
+        quantizer = _faiss().IndexFlatL2(d)
+        if index_type == "ivf_pq" and len(sample) < 2 ** self.config.faiss_pq_bits:
+            print(f"Only {len(sample)} chunks to train PQ codebooks, using ivf_flat instead")
+            index_type = "ivf_flat"
+        if index_type == "ivf_pq":
+            if d % self.config.faiss_pq_m:
+                raise ValueError(f"faiss_pq_m={self.config.faiss_pq_m} must divide the embedding size {d}")
+            index = _faiss().IndexIVFPQ(quantizer, d, nlist, self.config.faiss_pq_m, self.config.faiss_pq_bits)
+        else:
+            index = _faiss().IndexIVFFlat(quantizer, d, nlist)
+        index.train(sample)
+        return index
+
+    def _tune(self):
+        """Search-time parameters are not part of the saved index, set them after every open"""
+        index = self.store.index
+        if isinstance(index, _faiss().IndexHNSW):
+            index.hnsw.efSearch = self.config.faiss_ef_search
+        ivf = _faiss().try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.config.faiss_nprobe
+
+    def _add(self, batches):
+        if self.store is None:
+            sample = np.asarray([e for _, embeddings, _ in batches for e in embeddings], dtype=np.float32)
+            from langchain_community.docstore.in_memory import InMemoryDocstore
+            self.store = _langchain_faiss()(self.embeddings, self._new_index(sample), InMemoryDocstore(), {})
+            self._tune()
+        ivf = _faiss().try_extract_index_ivf(self.store.index)
+        for texts, embeddings, metadatas in batches:
+            ids = [self.chunk_id(metadata) for metadata in metadatas]
+            if ivf is None:
+                self.store.add_embeddings(list(zip(texts, embeddings)), metadatas, ids=ids)
+                continue
+            # IVF labels are never renumbered (see _remove), so new vectors go after the highest one
+            start = max(self.store.index_to_docstore_id, default=-1) + 1
+            labels = np.arange(start, start + len(ids), dtype=np.int64)
+            self.store.index.add_with_ids(np.asarray(embeddings, dtype=np.float32), labels)
+            self.store.docstore.add({
+                doc_id: LCDocument(id=doc_id, page_content=text, metadata=metadata)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            })
+            self.store.index_to_docstore_id.update(zip(labels.tolist(), ids))
 
-    def store_documents(self, chunks):
-        texts = [chunk.content for chunk in chunks]
-        metadatas = [chunk.metadata for chunk in chunks]
-        self.store = FAISS.from_texts(texts, self.embeddings, metadatas)
-        self.store.save_local(self.config.vector_store_path, index_name="index")
+    def store_documents(self, chunks, on_progress=None):
+        # batches held back until there are enough vectors to train a new IVF index
+        pending = []
+        for texts, metadatas, done in _batches(chunks, self.config.ingest_batch_size):
+            embeddings = self._embed(texts)
+            with self._write_lock, self._inserting():
+                if self.store is None and self.config.faiss_index_type in self._TRAINED_TYPES:
+                    pending.append((texts, embeddings, metadatas))
+                    if sum(len(batch[0]) for batch in pending) >= self.config.faiss_train_size:
+                        self._add(pending)
+                        pending = []
+                else:
+                    self._add([(texts, embeddings, metadatas)])
+            if on_progress:
+                on_progress(done, _total(chunks))
+        with self._write_lock, self._inserting():
+            if pending:
+                self._add(pending)
+            self.store.save_local(self.config.vector_store_path, index_name="index")
+
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None):
+        if not filter:
+            return self.store.similarity_search_by_vector(embedding, k=k)
+        # LangChain filters the fetch_k nearest chunks of the whole index; in a shared index one
+        # document's chunks can all rank below those, so widen the fetch until k of them are found
+        total = self.store.index.ntotal
+        fetch_k = min(total, max(20, 4 * k))
+        while True:
+            docs = self.store.similarity_search_by_vector(embedding, k=k, filter=filter, fetch_k=fetch_k)
+            if len(docs) >= k or fetch_k >= total:
+                return docs
+            fetch_k = min(total, fetch_k * 4)
+
+    async def asimilarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.similarity_search_by_vector(embedding, k, filter))
 
     def get_retriever(self, **kwargs):
-        return self.store.as_retriever(**kwargs)
+        search_kwargs = kwargs.get("search_kwargs", {})
+        if not search_kwargs.get("filter"):
+            return self.store.as_retriever(**kwargs)
+        from retrievers import StoreRetriever
+        return StoreRetriever(vector_store=self, k=search_kwargs.get("k", 5), filter=search_kwargs["filter"])
+
+    def chunk_metadata(self, document_id: str = None) -> Dict[str, dict]:
+        if self.store is None:
+            return {}
+        stored = {doc_id: self.store.docstore.search(doc_id).metadata for doc_id in self.store.index_to_docstore_id.values()}
+        if document_id is None:
+            return stored
+        return {doc_id: metadata for doc_id, metadata in stored.items() if metadata.get("document_id") == document_id}
+
+    def _remove(self, ids):
+        if isinstance(self.store.index, _faiss().IndexFlat):
+            self.store.delete(ids)
+            return
+        drop = set(ids)
+        ivf = _faiss().try_extract_index_ivf(self.store.index)
+        if ivf is not None:
+            # removed in place, without decoding the (for PQ, lossy) codes that stay;
+            # IVF lists keep each vector's label, so the labels are left with gaps
+            labels = [i for i, doc_id in self.store.index_to_docstore_id.items() if doc_id in drop]
+            if ivf.direct_map.type != _faiss().DirectMap.NoMap:
+                ivf.set_direct_map_type(_faiss().DirectMap.NoMap)
+            self.store.index.remove_ids(np.asarray(labels, dtype=np.int64))
+            for i in labels:
+                del self.store.index_to_docstore_id[i]
+            self.store.docstore.delete(ids)
+            return
+        # HNSW graphs cannot drop nodes, so refill a copy of the index with the vectors that
+        # stay; HNSWFlat stores them uncompressed, so this loses nothing
+        old = self.store.index
+        keep = [i for i, doc_id in sorted(self.store.index_to_docstore_id.items()) if doc_id not in drop]
+        index = _faiss().clone_index(old)
+        index.reset()
+        if keep:
+            index.add(old.reconstruct_n(0, old.ntotal)[keep])
+        self.store.index_to_docstore_id = {
+            new: self.store.index_to_docstore_id[i] for new, i in enumerate(keep)
+        }
+        self.store.docstore.delete(ids)
+        self.store.index = index
+        self._tune()
+
+    def has_document(self, document_id: str) -> bool:
+        return bool(self.chunk_metadata(document_id))
+
+    def delete_document(self, document_id: str):
+        self.delete(list(self.chunk_metadata(document_id)))
+
+    def delete(self, ids: List[str]):
+        if self.store is None or not ids:
+            return
+        with self._write_lock:
+            ids = list(set(ids) & set(self.store.index_to_docstore_id.values()))
+            if ids:
+                self._remove(ids)
+                self.store.save_local(self.config.vector_store_path, index_name="index")
 
 class ChromaVectorStore(BaseVectorStore):
     def load_existing(self) -> bool:
-        if os.path.exists(self.config.vector_store_path):
-            self.store = Chroma(
-                persist_directory=self.config.vector_store_path,
-                embedding_function=self.embeddings
-            )
-            return True
-        return False
-
-
-    def store_documents(self, chunks):
-        texts = [chunk.content for chunk in chunks]
-        metadatas = [chunk.metadata for chunk in chunks]
-        self.store = Chroma.from_texts(
-            texts,
-            self.embeddings,
-            metadatas=metadatas,
-            persist_directory=self.config.vector_store_path
+        if not os.path.exists(self.config.vector_store_path):
+            return False
+        self._open()
+        # a directory holding no chunks (a destroyed or never written index) is not an index
+        return bool(self.store.get(limit=1, include=[])["ids"])
+
+    def _open(self):
+        # imported on first use so deployments on other stores never load chromadb
+        import chromadb
+        from langchain_chroma.vectorstores import Chroma
+        client = chromadb.PersistentClient(path=self.config.vector_store_path)
+        # writes go to the collection directly, with the embeddings _write has already computed
+        self.collection = client.get_or_create_collection(self.config.collection_name)
+        self.store = Chroma(
+            client=client,
+            collection_name=self.config.collection_name,
+            embedding_function=self.embeddings
         )
 
+    def store_documents(self, chunks, on_progress=None):
+        self._write(chunks, on_progress, upsert=False)
+
+    def upsert_documents(self, chunks, on_progress=None):
+        self._write(chunks, on_progress, upsert=True)
+
+    def _write(self, chunks, on_progress, upsert: bool):
+        with self._write_lock:
+            if self.store is None:
+                self._open()
+        for texts, metadatas, done in _batches(chunks, self.config.ingest_batch_size):
+            # embedded here rather than by add_texts so the two stages are timed apart
+            embeddings = self._embed(texts)
+            with self._inserting():
+                write = self.collection.upsert if upsert else self.collection.add
+                write(
+                    ids=[self.chunk_id(metadata) for metadata in metadatas],
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    documents=texts
+                )
+            if on_progress:
+                on_progress(done, _total(chunks))
+
     def get_retriever(self, **kwargs):
         return self.store.as_retriever(**kwargs)
 
+    def has_document(self, document_id: str) -> bool:
+        return self.store is not None and bool(self.store.get(where={"document_id": document_id}, limit=1)["ids"])
+
+    def delete_document(self, document_id: str):
+        if self.store is not None:
+            self.store.delete(where={"document_id": document_id})
+
+    def chunk_metadata(self, document_id: str = None) -> Dict[str, dict]:
+        if self.store is None:
+            return {}
+        where = {"document_id": document_id} if document_id is not None else None
+        stored = self.store.get(where=where, include=["metadatas"])
+        return dict(zip(stored["ids"], stored["metadatas"]))
+
+    def delete(self, ids: List[str]):
+        if self.store is not None and ids:
+            self.store.delete(ids=ids)
+
+    def destroy(self):
+        # chromadb keeps one client per directory for the life of the process, and a client
+        # whose files were removed under it fails on the next write; drop the collection instead
+        with self._write_lock:
+            if self.store is None and os.path.exists(self.config.vector_store_path):
+                self._open()
+            if self.store is not None:
+                self.store.delete_collection()
+                self.store = self.collection = None
+
+class _Quantization:
+    """Encodes normalized float32 vectors into stored codes and scores a query against them.
+
+    float32 and float16 store the vector as is, int8 stores round(v / scale) with one scale
+    per dimension fitted on the first rows written (config.quantization_fit_size), binary
+    stores one sign bit per dimension.
+    """
+
+    MODES = ("float32", "float16", "int8", "binary")
+
+    def __init__(self, mode: str, dim: int, scale=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported vector quantization: {mode}")
+        self.mode = mode
+        self.dim = dim
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+        self.dtype = np.dtype({"float32": np.float32, "float16": np.float16, "int8": np.int8, "binary": np.uint8}[mode])
+        self.width = (dim + 7) // 8 if mode == "binary" else dim
+
+    def fit(self, vectors: np.ndarray):
+        if self.mode == "int8" and self.scale is None:
+            self.scale = np.maximum(np.abs(vectors).max(axis=0), 1e-6) / 127
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.mode == "int8":
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        return vectors.astype(self.dtype)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.mode == "int8":
+            # (codes * scale) . q == codes . (q * scale)
+            return codes.astype(np.float32) @ (query * self.scale)
+        if self.mode == "binary":
+            # bits . q ranks like the +-1 sign vector . q, without touching the query's precision
+            return np.unpackbits(codes, axis=1, count=self.dim).astype(np.float32) @ query
+        return codes.astype(np.float32, copy=False) @ query
+
+class _MappedIndex:
+    """Read-only memory maps over a NumpyVectorStore directory; opening deserializes nothing"""
+
+    def __init__(self, path: str, meta: dict):
+        count, dim = meta["count"], meta["dim"]
+        self.count = count
+        self.tenants = meta["tenants"]
+        self.quantization = _Quantization(meta["quantization"], dim, meta.get("scale"))
+        self.vectors = self._map(
+            os.path.join(path, "vectors.bin"), self.quantization.dtype, (count, self.quantization.width)
+        )
+        # float32 copies for re-ranking stay on disk; only the rows of candidates get paged in
+        self.full = None
+        if meta["full_precision"]:
+            self.full = self._map(os.path.join(path, "full.bin"), np.float32, (count, dim))
+        self.offsets = self._map(os.path.join(path, "offsets.bin"), np.int64, (count,))
+        # tenant code per row, -1 once the row is deleted
+        self.codes = self._map(os.path.join(path, "codes.bin"), np.int32, (count,), mode="r+")
+        self.docs_path = os.path.join(path, "docs.jsonl")
+
+    @staticmethod
+    def _map(path, dtype, shape, mode="r"):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def read_docs(self, rows) -> List[LCDocument]:
+        docs = []
+        with open(self.docs_path, "rb") as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                record = json.loads(f.readline())
+                docs.append(LCDocument(page_content=record["text"], metadata=record["metadata"]))
+        return docs
+
+class NumpyVectorStore(BaseVectorStore):
+    """Normalized embeddings in a memory-mapped matrix, searched with one matrix-vector product.
+
+    Layout under vector_store_path: vectors.bin (count rows quantized as
+    config.vector_quantization), full.bin (float32 rows, only when config.rerank_candidates
+    is set at creation), offsets.bin (byte offset of each row in docs.jsonl), codes.bin
+    (tenant code per row, -1 when deleted), docs.jsonl (text and metadata) and meta.json.
+    Several processes can open the same directory and share its pages through the
+    OS page cache. Deleted rows are only masked, never compacted.
+    """
+
+    # rows scored per step; bounds the float32 temporary that quantized blocks are widened into
+    _SEARCH_BLOCK = 4096
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.config.vector_store_path, "meta.json")
+
+    def _read_meta(self) -> dict:
+        with open(self._meta_path()) as f:
+            meta = json.load(f)
+        # stores written before quantization existed record only their dtype
+        meta.setdefault("quantization", meta.get("dtype", "float32"))
+        meta.setdefault("full_precision", False)
+        return meta
+
+    def load_existing(self) -> bool:
+        if not os.path.exists(self._meta_path()):
+            return False
+        self.store = _MappedIndex(self.config.vector_store_path, self._read_meta())
+        return True
+
+    def store_documents(self, chunks, on_progress=None):
+        os.makedirs(self.config.vector_store_path, exist_ok=True)
+        # a new int8 store holds its first rows back until there are enough to fit the scales on
+        fitting = self.config.vector_quantization == "int8" and not os.path.exists(self._meta_path())
+        pending = []
+        for texts, metadatas, done in _batches(chunks, self.config.ingest_batch_size):
+            vectors = np.asarray(self._embed(texts), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            pending.append((texts, metadatas, vectors))
+            if not fitting or sum(len(batch[0]) for batch in pending) >= self.config.quantization_fit_size:
+                self._append(pending)
+                pending = []
+                fitting = False
+            if on_progress:
+                on_progress(done, _total(chunks))
+        if pending:
+            self._append(pending)
+
+    def _append(self, batches):
+        path = self.config.vector_store_path
+        texts = [text for batch in batches for text in batch[0]]
+        metadatas = [metadata for batch in batches for metadata in batch[1]]
+        vectors = np.concatenate([batch[2] for batch in batches])
+        with self._write_lock, self._inserting():
+            meta = self._read_meta() if os.path.exists(self._meta_path()) else {
+                "count": 0,
+                "dim": vectors.shape[1],
+                "quantization": self.config.vector_quantization,
+                "full_precision": self.config.vector_quantization != "float32" and self.config.rerank_candidates > 0,
+                "tenants": {}
+            }
+            quantization = _Quantization(meta["quantization"], meta["dim"], meta.get("scale"))
+            if quantization.scale is None:
+                quantization.fit(vectors)
+                if quantization.scale is not None:
+                    meta["scale"] = quantization.scale.tolist()
+            codes = np.array(
+                [meta["tenants"].setdefault(m.get("document_id", ""), len(meta["tenants"])) for m in metadatas],
+                dtype=np.int32
+            )
+            offsets = []
+            with open(os.path.join(path, "docs.jsonl"), "ab") as f:
+                for text, metadata in zip(texts, metadatas):
+                    offsets.append(f.tell())
+                    f.write(json.dumps({"text": text, "metadata": metadata}).encode("utf-8") + b"\n")
+            with open(os.path.join(path, "vectors.bin"), "ab") as f:
+                f.write(quantization.encode(vectors).tobytes())
+            if meta["full_precision"]:
+                with open(os.path.join(path, "full.bin"), "ab") as f:
+                    f.write(vectors.tobytes())
+            with open(os.path.join(path, "offsets.bin"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            with open(os.path.join(path, "codes.bin"), "ab") as f:
+                f.write(codes.tobytes())
+            meta["count"] += len(texts)
+            tmp = self._meta_path() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._meta_path())
+            self.store = _MappedIndex(path, meta)
+
+    def _mask(self, filter: dict):
+        if not filter:
+            return self.store.codes >= 0
+        unsupported = set(filter) - {"document_id"}
+        if unsupported:
+            raise ValueError(f"NumpyVectorStore only filters on document_id, got {sorted(unsupported)}")
+        code = self.store.tenants.get(filter["document_id"])
+        if code is None:
+            return np.zeros(self.store.count, dtype=bool)
+        return self.store.codes == code
+
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None) -> List[LCDocument]:
+        if self.store is None or self.store.count == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = np.empty(self.store.count, dtype=np.float32)
+        for start in range(0, self.store.count, self._SEARCH_BLOCK):
+            block = self.store.vectors[start:start + self._SEARCH_BLOCK]
+            scores[start:start + len(block)] = self.store.quantization.scores(block, query)
+        scores[~self._mask(filter)] = -np.inf
+
+        available = int(np.isfinite(scores).sum())
+        k = min(k, available)
+        if k == 0:
+            return []
+        if self.store.full is not None and self.config.rerank_candidates > k:
+            # shortlist on the quantized scores, then order the shortlist at full precision
+            candidates = np.argpartition(-scores, min(self.config.rerank_candidates, available) - 1)
+            candidates = np.sort(candidates[:min(self.config.rerank_candidates, available)])
+            scores = np.full(self.store.count, -np.inf, dtype=np.float32)
+            scores[candidates] = self.store.full[candidates] @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self.store.read_docs(top)
+
+    async def asimilarity_search_by_vector(self, embedding, k: int = 5, filter: dict = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.similarity_search_by_vector(embedding, k, filter))
+
+    def get_retriever(self, **kwargs):
+        # langchain_core.retrievers is slow to import and only needed here
+        from retrievers import StoreRetriever
+        search_kwargs = kwargs.get("search_kwargs", {})
+        return StoreRetriever(vector_store=self, k=search_kwargs.get("k", 5), filter=search_kwargs.get("filter"))
+
+    def has_document(self, document_id: str) -> bool:
+        return self.store is not None and bool(self._mask({"document_id": document_id}).any())
+
+    def delete_document(self, document_id: str):
+        if self.store is None:
+            return
+        with self._write_lock:
+            mask = self._mask({"document_id": document_id})
+            if mask.any():
+                self.store.codes[mask] = -1
+                self.store.codes.flush()
+
+    def _stored(self, document_id: str = None):
+        """(store id, row, metadata) of every live row; rows written without a chunk_key are named by row"""
+        if self.store is None or self.store.count == 0:
+            return []
+        rows = np.flatnonzero(self._mask({"document_id": document_id} if document_id is not None else None))
+        return [
+            (self.chunk_id(doc.metadata) if "chunk_key" in doc.metadata else f"row:{row}", row, doc.metadata)
+            for row, doc in zip(rows, self.store.read_docs(rows))
+        ]
+
+    def chunk_metadata(self, document_id: str = None) -> Dict[str, dict]:
+        return {chunk_id: metadata for chunk_id, _, metadata in self._stored(document_id)}
+
+    def delete(self, ids: List[str]):
+        if self.store is None or not ids:
+            return
+        with self._write_lock:
+            wanted = set(ids)
+            rows = [row for chunk_id, row, _ in self._stored() if chunk_id in wanted]
+            if rows:
+                self.store.codes[rows] = -1
+                self.store.codes.flush()
+
 class VectorStoreFactory:
     @staticmethod
     def create_vector_store(config, embeddings):
+        # quantized vectors and full-precision reranking are NumpyVectorStore features
+        unsupported = []
+        if config.vector_quantization != "float32":
+            unsupported.append(f"vector_quantization={config.vector_quantization!r}")
+        if config.rerank_candidates > 0:
+            unsupported.append(f"rerank_candidates={config.rerank_candidates}")
+        if unsupported and config.vector_store_type != "numpy":
+            raise ValueError(
+                f"{config.vector_store_type} vector store does not support {' or '.join(unsupported)}; "
+                f"use vector_store_type='numpy'"
+            )
         if config.vector_store_type == "faiss":
             return FAISSVectorStore(config, embeddings)
         elif config.vector_store_type == "chroma":
             return ChromaVectorStore(config, embeddings)
+        elif config.vector_store_type == "numpy":
+            return NumpyVectorStore(config, embeddings)
         else:
             raise ValueError(f"Unsupported vector store type: {config.vector_store_type}")
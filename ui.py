@@ -68,16 +68,24 @@ async def main(message: cl.Message):
         ).send()
         return
 
-    msg = cl.Message(content="Thinking...")
+    msg = cl.Message(content="")
     await msg.send()
 
     try:
-        response = session.qa_system.query(message.content)
+        source_documents = []
+        answer = ""
+        async for event, data in session.qa_system.astream(message.content):
+            if event == "sources":
+                source_documents = data
+            else:
+                answer += data
+                await msg.stream_token(data)
+
         elements = []
         found_sources = []
 
-        if response.answer != "I don't know":
-            for i, source in enumerate(response.source_documents):
+        if answer != "I don't know":
+            for i, source in enumerate(source_documents):
                 src_name = f"Source {i+1}"
                 found_sources.append(src_name)
 
@@ -89,13 +97,13 @@ async def main(message: cl.Message):
                     )
                 )
         
-        answer = response.answer
         if found_sources:
-            answer += f"\nSources: {', '.join(found_sources)}"
+            await msg.stream_token(f"\nSources: {', '.join(found_sources)}")
         else:
-            answer += "\nNo sources found"
+            await msg.stream_token("\nNo sources found")
         
-        await cl.Message(content=answer, elements=elements).send()
+        msg.elements = elements
+        await msg.update()
 
     except Exception as e:
         raise e